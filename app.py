@@ -1,28 +1,40 @@
 import json
 import os
+import secrets
+import threading
 import traceback
 from pathlib import Path
 
 from flask import Flask, jsonify, render_template, request, redirect, session
-from google_auth_oauthlib.flow import Flow
 
+from jobs import JobManager
+from metrics import render_metrics
 from lab_agent import (
+    BULK_WORKERS,
+    MAX_BULK_WORKERS,
     SCOPES,
+    credential_manager,
     get_credentials,
+    token_store,
     get_services,
-    list_pending_assignments,
-    list_drive_folder_files,
+    invalidate_services,
+    cached_drive_folder_files,
+    cached_pending_assignments,
+    listing_cache,
+    run_bulk,
     run_pipeline,
+    warm_up,
 )
 
 
 APP_ROOT = Path(__file__).parent
 CONFIG_PATH = APP_ROOT / "config.json"
-TOKEN_PATH = APP_ROOT / "token.json"
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret-key")
 
+jobs = JobManager()
+
 
 def load_config():
     if CONFIG_PATH.exists():
@@ -31,17 +43,26 @@ def load_config():
     return {}
 
 
-def save_config(data: dict):
-    with CONFIG_PATH.open("w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+def session_id(create: bool = False):
+    # Random per-browser id in the signed session cookie; it keys the user's
+    # token in token_store and owns the jobs they submit.
+    sid = session.get("sid")
+    if sid is None and create:
+        sid = secrets.token_urlsafe(32)
+        session["sid"] = sid
+    return sid
+
+
+def shared_login_allowed() -> bool:
+    # Local single-user setups may still run on the CLI's token.json.
+    return os.getenv("WEB_OAUTH") != "1"
 
 
 def auth_status():
     try:
-        if os.getenv("WEB_OAUTH") == "1" and not TOKEN_PATH.exists():
-            return False
-        creds = get_credentials()
-        return bool(creds and creds.valid)
+        if token_store.is_logged_in(session_id()):
+            return True
+        return shared_login_allowed() and credential_manager.is_logged_in()
     except Exception:
         return False
 
@@ -69,6 +90,8 @@ def load_oauth_client():
 
 
 def build_flow():
+    from google_auth_oauthlib.flow import Flow
+
     client = load_oauth_client()
     flow = Flow.from_client_config(client, scopes=SCOPES)
     redirect_uri = os.getenv("GOOGLE_REDIRECT_URI")
@@ -150,9 +173,15 @@ def index():
 def health():
     return "ok", 200
 
+
+@app.get("/metrics")
+def metrics():
+    return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+
 @app.get("/api/config")
 def api_config():
-    return jsonify(load_config())
+    return jsonify(session.get("config") or load_config())
 
 
 @app.get("/api/auth-status")
@@ -170,6 +199,7 @@ def login():
             prompt="consent",
         )
         session["state"] = state
+        session_id(create=True)
         return redirect(auth_url)
     except Exception as exc:
         traceback.print_exc()
@@ -181,9 +211,7 @@ def oauth2callback():
     try:
         flow = build_flow()
         flow.fetch_token(authorization_response=request.url)
-        creds = flow.credentials
-        with TOKEN_PATH.open("w", encoding="utf-8") as f:
-            f.write(creds.to_json())
+        token_store.set(session_id(create=True), flow.credentials)
         return redirect("/")
     except Exception as exc:
         traceback.print_exc()
@@ -193,8 +221,18 @@ def oauth2callback():
 @app.post("/api/logout")
 def api_logout():
     try:
-        if TOKEN_PATH.exists():
-            TOKEN_PATH.unlink()
+        sid = session_id()
+        try:
+            creds = token_store.get(sid)
+        finally:
+            # Also drop a stored token that no longer loads or refreshes.
+            token_store.clear(sid)
+        if creds is not None:
+            invalidate_services(creds)
+        elif shared_login_allowed():
+            credential_manager.clear()
+            invalidate_services()
+        session.pop("sid", None)
         return jsonify({"logged_in": False})
     except Exception as exc:
         return jsonify({"logged_in": False, "error": str(exc)}), 500
@@ -207,11 +245,13 @@ def api_list_assignments():
         return jsonify({"error": "class_id is required"}), 400
     class_id = normalize_class_id(class_id)
     try:
-        creds = get_credentials()
+        creds = get_credentials(session_id())
     except Exception as exc:
         return jsonify({"error": str(exc)}), 401
     _, _, classroom_service = get_services(creds)
-    pending = list_pending_assignments(classroom_service, class_id)
+    if request.args.get("refresh"):
+        listing_cache.invalidate("assignments", class_id)
+    pending = cached_pending_assignments(creds, classroom_service, class_id)
     return jsonify(
         [
             {"id": work_id, "title": title, "due": due, "state": state}
@@ -233,11 +273,13 @@ def api_list_drive_folder():
             }
         ), 400
     try:
-        creds = get_credentials()
+        creds = get_credentials(session_id())
     except Exception as exc:
         return jsonify({"error": str(exc)}), 401
     drive_service, _, _ = get_services(creds)
-    files = list_drive_folder_files(drive_service, folder_id)
+    if request.args.get("refresh"):
+        listing_cache.invalidate("folder", folder_id)
+    files = cached_drive_folder_files(creds, drive_service, folder_id)
     return jsonify(files)
 
 
@@ -260,21 +302,66 @@ def api_run():
         "share_images": bool(payload.get("share_images", True)),
         "screenshot_outputs": bool(payload.get("screenshot_outputs", True)),
         "auto_number": bool(payload.get("auto_number", True)),
+        "incremental": bool(payload.get("incremental", False)),
     }
-    save_config(config)
+    session["config"] = config
+
+    sid = session_id()
+    job = jobs.submit(
+        run_pipeline,
+        config,
+        auto_number=config["auto_number"],
+        turn_in=bool(payload.get("turn_in", False)),
+        session_id=sid,
+        owner=sid,
+    )
+    return jsonify({"job_id": job.id}), 202
 
+
+@app.post("/api/run-bulk")
+def api_run_bulk():
+    payload = request.get_json(force=True)
+    folder_id = normalize_folder_id(payload.get("folder_id") or "")
+    if not folder_id:
+        return jsonify({"error": "folder_id is required"}), 400
+    workers = payload.get("workers", BULK_WORKERS)
     try:
-        doc_id = run_pipeline(
-            config,
-            auto_number=config["auto_number"],
-            turn_in=bool(payload.get("turn_in", False)),
-        )
-        return jsonify({"doc_id": doc_id})
-    except Exception as exc:
-        traceback.print_exc()
-        return jsonify({"error": str(exc)}), 500
+        if isinstance(workers, bool) or int(workers) != float(workers):
+            raise ValueError
+        workers = int(workers)
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({"error": "workers must be a whole number"}), 400
+    workers = max(1, min(workers, MAX_BULK_WORKERS))
+    config = {
+        "doc_title": payload.get("doc_title", "Lab Evidence"),
+        "share_images": bool(payload.get("share_images", True)),
+        "screenshot_outputs": bool(payload.get("screenshot_outputs", True)),
+    }
+    sid = session_id()
+    job = jobs.submit(
+        run_bulk,
+        config,
+        folder_id,
+        auto_number=bool(payload.get("auto_number", True)),
+        workers=workers,
+        session_id=sid,
+        owner=sid,
+    )
+    return jsonify({"job_id": job.id}), 202
+
+
+@app.get("/api/jobs/<job_id>")
+def api_job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None or job.owner != session_id():
+        return jsonify({"error": "Unknown job id"}), 404
+    snapshot = job.snapshot()
+    if snapshot["status"] == "done":
+        snapshot["doc_id"] = snapshot["result"]
+    return jsonify(snapshot)
 
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "5055"))
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
     app.run(host="0.0.0.0", port=port, debug=False)
@@ -0,0 +1,248 @@
+import asyncio
+import base64
+import io
+import os
+import time
+from datetime import datetime
+
+import httplib2
+import httpx
+from google.auth.transport.requests import Request
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+
+from image_prep import EXTENSIONS
+from lab_agent import MAX_NOTEBOOK_BYTES, listing_cache, pending_assignments
+from metrics import BYTES_DOWNLOADED, BYTES_UPLOADED, observe_api_call
+from notebook_stream import NotebookStreamParser
+from retry import MAX_RETRIES, backoff_delay, is_retryable
+
+
+MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "100"))
+REQUEST_TIMEOUT = 60.0
+
+
+def _response(status: int, headers) -> httplib2.Response:
+    info = {key.lower(): value for key, value in headers.items()}
+    info["status"] = str(status)
+    return httplib2.Response(info)
+
+
+class AsyncGoogleClient:
+    # Sends requests built by the regular discovery services (nothing is
+    # executed on their httplib2 transport) over one shared httpx pool, so a
+    # single event loop can keep many API calls in flight. Responses go
+    # through the request's own postproc, so callers get the same dicts and
+    # HttpErrors as from .execute().
+    def __init__(self, creds, max_connections: int = MAX_CONNECTIONS):
+        self.creds = creds
+        self._client = httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        self._refresh_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def _headers(self, headers: dict) -> dict:
+        if not self.creds.valid:
+            async with self._refresh_lock:
+                if not self.creds.valid:
+                    # google-auth refreshes synchronously; keep it off the loop.
+                    await asyncio.to_thread(self.creds.refresh, Request())
+        # httpx sets the length itself from the content it sends.
+        headers = {k: v for k, v in headers.items() if k.lower() != "content-length"}
+        self.creds.apply(headers)
+        return headers
+
+    async def execute(self, request, retries: int = MAX_RETRIES):
+        attempt = 0
+        started = time.perf_counter()
+        method = request.methodId or "unknown"
+        while True:
+            try:
+                resp = await self._client.request(
+                    request.method,
+                    request.uri,
+                    content=request.body,
+                    headers=await self._headers(request.headers),
+                )
+                result = request.postproc(
+                    _response(resp.status_code, resp.headers), resp.content
+                )
+            except (HttpError, httpx.TransportError) as exc:
+                retryable = (
+                    is_retryable(exc) if isinstance(exc, HttpError) else True
+                )
+                if attempt >= retries or not retryable:
+                    status = exc.resp.status if isinstance(exc, HttpError) else "error"
+                    observe_api_call(method, time.perf_counter() - started, str(status))
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+            else:
+                observe_api_call(method, time.perf_counter() - started, "ok")
+                return result
+
+    async def download(self, request, sink, retries: int = MAX_RETRIES):
+        # Streams a media GET into sink.write(); a dropped connection resumes
+        # with a Range request from the last byte received.
+        attempt = 0
+        received = 0
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            while True:
+                headers = await self._headers(request.headers)
+                if received:
+                    headers["range"] = f"bytes={received}-"
+                try:
+                    async with self._client.stream("GET", request.uri, headers=headers) as resp:
+                        if resp.status_code >= 300:
+                            await resp.aread()
+                            raise HttpError(
+                                _response(resp.status_code, resp.headers),
+                                resp.content,
+                                uri=request.uri,
+                            )
+                        if received and resp.status_code != 206:
+                            raise RuntimeError("Drive ignored the range request on resume.")
+                        async for chunk in resp.aiter_bytes():
+                            sink.write(chunk)
+                            received += len(chunk)
+                    outcome = "ok"
+                    return received
+                except (HttpError, httpx.TransportError) as exc:
+                    retryable = (
+                        is_retryable(exc) if isinstance(exc, HttpError) else True
+                    )
+                    if attempt >= retries or not retryable:
+                        if isinstance(exc, HttpError):
+                            outcome = str(exc.resp.status)
+                        raise
+                    await asyncio.sleep(backoff_delay(attempt))
+                    attempt += 1
+        finally:
+            observe_api_call(
+                request.methodId or "media", time.perf_counter() - started, outcome
+            )
+
+
+async def _list_all_async(client: AsyncGoogleClient, collection, key: str, **kwargs) -> list:
+    items = []
+    request = collection.list(**kwargs)
+    while request is not None:
+        response = await client.execute(request)
+        items.extend(response.get(key, []))
+        request = collection.list_next(request, response)
+    return items
+
+
+async def download_notebook_async(
+    client: AsyncGoogleClient,
+    drive_service,
+    file_id: str,
+    max_bytes: int = MAX_NOTEBOOK_BYTES,
+) -> dict:
+    parser = NotebookStreamParser(max_bytes=max_bytes)
+    request = drive_service.files().get_media(fileId=file_id, supportsAllDrives=True)
+    try:
+        await client.download(request, parser)
+    finally:
+        BYTES_DOWNLOADED.inc(parser.bytes_seen)
+    return parser.close()
+
+
+async def upload_image_bytes_async(
+    client: AsyncGoogleClient,
+    drive_service,
+    raw: bytes,
+    prefix: str = "lab-evidence",
+    mimetype: str = "image/png",
+) -> str:
+    BYTES_UPLOADED.inc(len(raw))
+    media = MediaIoBaseUpload(io.BytesIO(raw), mimetype=mimetype)
+    extension = EXTENSIONS.get(mimetype, "png")
+    file_metadata = {"name": f"{prefix}-{datetime.utcnow().isoformat()}.{extension}"}
+    created = await client.execute(
+        drive_service.files().create(
+            body=file_metadata, media_body=media, fields="id", supportsAllDrives=True
+        )
+    )
+    return created["id"]
+
+
+async def upload_image_async(client: AsyncGoogleClient, drive_service, image_b64: str) -> str:
+    return await upload_image_bytes_async(client, drive_service, base64.b64decode(image_b64))
+
+
+async def maybe_share_file_async(client: AsyncGoogleClient, drive_service, file_id: str):
+    await client.execute(
+        drive_service.permissions().create(
+            fileId=file_id,
+            body={"type": "anyone", "role": "reader"},
+            supportsAllDrives=True,
+        )
+    )
+
+
+async def list_pending_assignments_async(
+    client: AsyncGoogleClient, classroom_service, class_id: str
+):
+    course_work = classroom_service.courses().courseWork()
+    items, submissions = await asyncio.gather(
+        _list_all_async(client, course_work, "courseWork", courseId=class_id),
+        _list_all_async(
+            client,
+            course_work.studentSubmissions(),
+            "studentSubmissions",
+            courseId=class_id,
+            courseWorkId="-",
+            userId="me",
+        ),
+    )
+    return pending_assignments(items, submissions)
+
+
+async def attach_and_turn_in_async(
+    client: AsyncGoogleClient,
+    classroom_service,
+    class_id: str,
+    assignment_id: str,
+    doc_id: str,
+):
+    submissions_api = classroom_service.courses().courseWork().studentSubmissions()
+    submissions = await client.execute(
+        submissions_api.list(courseId=class_id, courseWorkId=assignment_id, userId="me")
+    )
+    items = submissions.get("studentSubmissions", [])
+    if not items:
+        raise RuntimeError("No student submission found for this assignment.")
+    submission_id = items[0]["id"]
+
+    try:
+        await client.execute(
+            submissions_api.modifyAttachments(
+                courseId=class_id,
+                courseWorkId=assignment_id,
+                id=submission_id,
+                body={"addAttachments": [{"driveFile": {"id": doc_id}}]},
+            )
+        )
+        await client.execute(
+            submissions_api.turnIn(
+                courseId=class_id, courseWorkId=assignment_id, id=submission_id
+            )
+        )
+    finally:
+        listing_cache.invalidate("assignments", class_id)
@@ -0,0 +1,34 @@
+import argparse
+import json
+import time
+
+from benchmarks.synthetic import make_notebook
+from lab_agent import parse_notebook
+
+
+def bench(cells: int, repeat: int):
+    nb = make_notebook(cells=cells, questions=max(1, cells // 50))
+    size = len(json.dumps(nb))
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse_notebook(nb, auto_number=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(
+        f"{cells:>7} cells  {size / 1e6:7.1f} MB  {best * 1000:8.1f} ms  "
+        f"{cells / best:10.0f} cells/s  {size / best / 1e6:7.1f} MB/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cells", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for cells in args.cells:
+        bench(cells, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import argparse
+import contextlib
+import io
+import json
+import time
+from unittest import mock
+
+from google.oauth2.credentials import Credentials
+
+import lab_agent
+from benchmarks.fake_google import FakeGoogle
+from benchmarks.synthetic import make_notebook
+from lab_agent import (
+    build_doc_requests,
+    capture_output_screenshots,
+    parse_notebook,
+    render_outputs_html,
+)
+
+
+NOTEBOOK_ID = "bench-notebook"
+
+
+def best_of(repeat: int, fn):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def line(label: str, seconds: float, units: float, unit: str, extra: str = ""):
+    print(
+        f"  {label:<20} {seconds * 1000:9.1f} ms  {units / seconds:10.1f} {unit}/s  {extra}".rstrip()
+    )
+
+
+def run_pipeline_once(fake: FakeGoogle, services: tuple, config: dict) -> dict:
+    stages = []
+
+    def progress(stage: str):
+        stages.append((stage, time.perf_counter()))
+
+    creds = Credentials(token="bench")
+    start = time.perf_counter()
+    with mock.patch.object(lab_agent, "get_credentials", lambda session_id=None: creds), mock.patch.object(
+        lab_agent, "get_services", lambda creds: services
+    ), contextlib.redirect_stdout(io.StringIO()):
+        lab_agent.run_pipeline(config, auto_number=True, turn_in=True, progress=progress)
+    end = time.perf_counter()
+
+    marks = [t for _, t in stages[1:]] + [end]
+    return {
+        "seconds": end - start,
+        "stages": {name: after - t for (name, t), after in zip(stages, marks)},
+    }
+
+
+def run_config(screenshots: bool) -> dict:
+    # Every repeat must download, parse and upload again, so both caches are
+    # off (they would also write into the working directory).
+    return {
+        "notebook_file_id": NOTEBOOK_ID,
+        "class_id": "course-1",
+        "assignment_id": "cw-1",
+        "share_images": True,
+        "screenshot_outputs": screenshots,
+        "upload_cache": False,
+        "notebook_cache": False,
+    }
+
+
+def bench(cells: int, args):
+    nb = make_notebook(
+        cells=cells,
+        questions=max(1, cells // 50),
+        image_every=args.image_every,
+        image_bytes=args.image_bytes,
+        output_lines=args.output_lines,
+    )
+    raw = json.dumps(nb).encode("utf-8")
+    print(f"{cells} cells, {len(raw) / 1e6:.1f} MB, {args.latency_ms:g} ms API latency")
+
+    seconds, (questions, screenshot_map) = best_of(
+        args.repeat, lambda: parse_notebook(nb, auto_number=True)
+    )
+    line("parse_notebook", seconds, cells, "cells")
+
+    fake = FakeGoogle(latency_ms=args.latency_ms, files={NOTEBOOK_ID: raw})
+    services = fake.services()
+    images = sum(1 for q in questions.values() for item in q["items"] if item.get("image_b64"))
+    seconds, requests = best_of(
+        args.repeat,
+        lambda: build_doc_requests(questions, services[0], share_images=True),
+    )
+    line(
+        "build_doc_requests",
+        seconds,
+        len(questions),
+        "questions",
+        f"{len(requests)} requests, {images} images",
+    )
+
+    if args.screenshots:
+        page_html = render_outputs_html(nb, screenshot_map)
+        seconds, shots = best_of(args.repeat, lambda: capture_output_screenshots(page_html))
+        line("screenshots", seconds, max(1, len(shots)), "outputs")
+
+    config = run_config(args.screenshots)
+    runs = []
+    fake.reset_counters()
+    for _ in range(args.repeat):
+        runs.append(run_pipeline_once(fake, services, config))
+    run = min(runs, key=lambda r: r["seconds"])
+    calls = sum(fake.calls.values()) // args.repeat
+    line("run_pipeline", run["seconds"], len(raw) / 1e6, "MB", f"{calls} API calls/run")
+    for stage, seconds in run["stages"].items():
+        print(f"    {stage:<18} {seconds * 1000:9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline pipeline benchmark against an in-process Google API fake."
+    )
+    parser.add_argument("--cells", type=int, nargs="+", default=[200, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--image-every", type=int, default=10)
+    parser.add_argument("--image-bytes", type=int, default=20_000)
+    parser.add_argument("--output-lines", type=int, default=5)
+    parser.add_argument(
+        "--screenshots", action="store_true", help="Also capture screenshots (needs Chromium)."
+    )
+    args = parser.parse_args()
+    for cells in args.cells:
+        bench(cells, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import argparse
+import time
+
+from benchmarks.synthetic import make_notebook
+from browser_pool import BrowserPool
+from lab_agent import capture_output_screenshots, parse_notebook, render_outputs_html
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cells", type=int, nargs="+", default=[100, 400])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pool = BrowserPool(size=1)
+    try:
+        pool.warm()
+        for cells in args.cells:
+            nb = make_notebook(cells=cells, image_every=5)
+            _, screenshot_map = parse_notebook(nb, auto_number=True)
+            page_html = render_outputs_html(nb, screenshot_map)
+            for mode, crop in (("elements", False), ("crop", True)):
+                best = None
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    shots = capture_output_screenshots(page_html, pool=pool, crop=crop)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                print(
+                    f"{cells:>6} cells  {len(shots):>5} outputs  {mode:<8}  "
+                    f"{best * 1000:8.1f} ms  {len(shots) / best:7.1f} outputs/s"
+                )
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from benchmarks.bench_pipeline import best_of
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = [
+    ("import lab_agent", [sys.executable, "-c", "import lab_agent"]),
+    ("import app", [sys.executable, "-c", "import app"]),
+    ("lab_agent.py --help", [sys.executable, "lab_agent.py", "--help"]),
+    (
+        "import + warm_up",
+        [sys.executable, "-c", "import lab_agent; lab_agent.warm_up(browser=False)"],
+    ),
+]
+
+
+def run_command(argv: list):
+    subprocess.run(argv, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_server(preload: bool, timeout: float) -> float:
+    # Seconds from launching gunicorn until /health answers.
+    port = free_port()
+    env = dict(os.environ, GUNICORN_PRELOAD="1" if preload else "0", WARM_BROWSER="0")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "app:app",
+            "-c", "gunicorn.conf.py",
+            "--workers", "1", "--threads", "8",
+            "--bind", f"127.0.0.1:{port}",
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("gunicorn did not answer /health in time.")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-server", action="store_true")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    for label, argv in COMMANDS:
+        best, _ = best_of(args.repeat, lambda: run_command(argv))
+        print(f"{label:<28} {best * 1000:8.1f} ms")
+
+    if args.no_server:
+        return
+    for preload in (True, False):
+        best, _ = best_of(args.repeat, lambda: time_server(preload, args.timeout))
+        label = f"gunicorn to /health ({'preload' if preload else 'no preload'})"
+        print(f"{label:<28} {best * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import json
+import time
+
+from benchmarks.synthetic import make_notebook
+from notebook_stream import NotebookStreamParser
+
+
+def stream(raw: bytes, chunk_size: int) -> dict:
+    parser = NotebookStreamParser()
+    for start in range(0, len(raw), chunk_size):
+        parser.write(raw[start : start + chunk_size])
+    return parser.close()
+
+
+def best_of(repeat: int, fn) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    # Parse time per MB should stay flat as notebooks grow; a parser that
+    # re-copies its buffer per cell shows up as a rising ms/MB column.
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cells", type=int, nargs="+", default=[2000, 8000, 32000])
+    parser.add_argument("--chunk-mb", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    chunk_size = args.chunk_mb * 1024 * 1024
+    for cells in args.cells:
+        nb = make_notebook(cells=cells, image_every=5, image_bytes=2_000)
+        raw = json.dumps(nb, indent=1).encode("utf-8")
+        mb = len(raw) / 1e6
+        streamed = best_of(args.repeat, lambda: stream(raw, chunk_size))
+        loads = best_of(args.repeat, lambda: json.loads(raw))
+        print(
+            f"{cells:>7} cells  {mb:7.1f} MB  stream {streamed * 1000:8.1f} ms "
+            f"({streamed * 1000 / mb:6.2f} ms/MB)  json.loads {loads * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import email.parser
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import httplib2
+from googleapiclient.discovery import build_from_document
+
+from lab_agent import SERVICE_VERSIONS, _discovery_doc
+
+
+class FakeGoogle:
+    # In-process stand-in for the slice of Drive, Docs and Classroom the
+    # pipeline uses. It is passed to build_from_document as the Http object,
+    # so requests go through the real client library (URL building, media
+    # upload/download, batch encoding) and only the network is replaced.
+    def __init__(self, latency_ms: float = 0.0, files: dict = None):
+        self.latency = latency_ms / 1000.0
+        self.files = dict(files or {})
+        self.docs = {}
+        # doc_id -> HTTP status that batchUpdate answers with (403 for a Doc
+        # made read-only by turn-in, for example).
+        self.doc_errors = {}
+        # Drive permissionId of the signed-in account.
+        self.permission_id = "perm-1"
+        self.calls = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def services(self) -> tuple:
+        return tuple(
+            build_from_document(_discovery_doc(name, version), http=self)
+            for name, version in SERVICE_VERSIONS
+        )
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls = {}
+            self.bytes_in = 0
+            self.bytes_out = 0
+
+    # httplib2.Http interface used by googleapiclient.
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        status, resp_headers, content = self._dispatch(
+            method, uri, body or b"", headers or {}
+        )
+        with self._lock:
+            self.bytes_in += len(body or b"")
+            self.bytes_out += len(content)
+        resp_headers = dict(resp_headers, status=str(status))
+        return httplib2.Response(resp_headers), content
+
+    def _new_id(self, prefix: str) -> str:
+        with self._lock:
+            return f"{prefix}-{next(self._ids)}"
+
+    def _count(self, name: str):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _dispatch(self, method: str, uri: str, body: bytes, headers: dict):
+        parts = urlsplit(uri)
+        path = parts.path
+        query = parse_qs(parts.query)
+        if path.startswith("/batch/"):
+            self._count("batch")
+            return self._batch(body, headers)
+        for pattern, handler_method, handler in self._ROUTES:
+            match = re.fullmatch(pattern, path)
+            if match and method == handler_method:
+                self._count(handler.__name__.lstrip("_"))
+                return handler(self, *match.groups(), query=query, body=body, headers=headers)
+        return 404, {}, json.dumps({"error": {"code": 404, "message": uri}}).encode()
+
+    def _json(self, payload, status: int = 200):
+        return status, {"content-type": "application/json"}, json.dumps(payload).encode()
+
+    def _get_file(self, file_id, *, query, body, headers):
+        data = self.files.get(file_id)
+        if query.get("alt") != ["media"]:
+            meta = {"id": file_id}
+            if data is not None:
+                meta["md5Checksum"] = hashlib.md5(data).hexdigest()
+            return self._json(meta)
+        if data is None:
+            return self._json({"error": {"code": 404, "message": "File not found"}}, 404)
+        match = re.match(r"bytes=(\d+)-(\d+)", headers.get("range", ""))
+        start, end = (int(match.group(1)), int(match.group(2))) if match else (0, len(data) - 1)
+        chunk = data[start : end + 1]
+        return 206, {
+            "content-range": f"bytes {start}-{start + len(chunk) - 1}/{len(data)}",
+            "content-type": "application/octet-stream",
+        }, chunk
+
+    def _create_file(self, *, query, body, headers):
+        return self._json({"id": self._new_id("file")})
+
+    def _delete_file(self, file_id, *, query, body, headers):
+        with self._lock:
+            self.docs.pop(file_id, None)
+            self.files.pop(file_id, None)
+        return 204, {}, b""
+
+    def _create_permission(self, file_id, *, query, body, headers):
+        return self._json({"id": "anyoneWithLink"})
+
+    def _create_document(self, *, query, body, headers):
+        doc_id = self._new_id("doc")
+        with self._lock:
+            self.docs[doc_id] = 1
+        return self._json({"documentId": doc_id, "revisionId": "rev-1"})
+
+    def _get_document(self, doc_id, *, query, body, headers):
+        with self._lock:
+            revision = self.docs.get(doc_id)
+        if revision is None:
+            return self._json({"error": {"code": 404, "message": "Not found"}}, 404)
+        return self._json({"documentId": doc_id, "revisionId": f"rev-{revision}"})
+
+    def _batch_update(self, doc_id, *, query, body, headers):
+        payload = json.loads(body or b"{}")
+        with self._lock:
+            status = self.doc_errors.get(doc_id) or (404 if doc_id not in self.docs else None)
+            if status is None:
+                self.docs[doc_id] += 1
+                revision = self.docs[doc_id]
+        if status is not None:
+            return self._json({"error": {"code": status, "message": "Rejected"}}, status)
+        return self._json(
+            {
+                "documentId": doc_id,
+                "replies": [{} for _ in payload.get("requests", [])],
+                "writeControl": {"requiredRevisionId": f"rev-{revision}"},
+            }
+        )
+
+    def _list_submissions(self, course_id, course_work_id, *, query, body, headers):
+        work_id = "cw-1" if course_work_id == "-" else course_work_id
+        return self._json(
+            {
+                "studentSubmissions": [
+                    {"id": "sub-1", "courseWorkId": work_id, "state": "CREATED"}
+                ]
+            }
+        )
+
+    def _list_course_work(self, course_id, *, query, body, headers):
+        return self._json({"courseWork": [{"id": "cw-1", "title": "Lab"}]})
+
+    def _modify_attachments(self, course_id, course_work_id, submission_id, *, query, body, headers):
+        return self._json({"id": submission_id})
+
+    def _turn_in(self, course_id, course_work_id, submission_id, *, query, body, headers):
+        return self._json({})
+
+    def _list_files(self, *, query, body, headers):
+        with self._lock:
+            names = list(self.files)
+        return self._json(
+            {
+                "files": [
+                    {"id": name, "name": f"{name}.ipynb", "mimeType": "application/x-ipynb+json"}
+                    for name in names
+                ]
+            }
+        )
+
+    def _about(self, *, query, body, headers):
+        return self._json({"user": {"permissionId": self.permission_id}})
+
+    def _start_page_token(self, *, query, body, headers):
+        return self._json({"startPageToken": "1"})
+
+    def _list_changes(self, *, query, body, headers):
+        return self._json({"newStartPageToken": query.get("pageToken", ["1"])[0], "changes": []})
+
+    def _batch(self, body: bytes, headers: dict):
+        content_type = headers.get("content-type") or headers.get("Content-Type")
+        message = email.parser.Parser().parsestr(
+            f"content-type: {content_type}\r\n\r\n" + body.decode("utf-8")
+        )
+        boundary = "fake_batch_boundary"
+        out = []
+        for part in message.get_payload():
+            request_line, rest = part.get_payload().split("\n", 1)
+            method, target, _ = request_line.split(" ", 2)
+            inner_body = rest.split("\r\n\r\n", 1)[1] if "\r\n\r\n" in rest else ""
+            status, _, content = self._dispatch(
+                method, target, inner_body.encode("utf-8"), {}
+            )
+            content_id = part["Content-ID"][1:-1]
+            out.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\n"
+                "Content-Type: application/json\r\n\r\n"
+                f"{content.decode('utf-8')}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        return 200, {"content-type": f"multipart/mixed; boundary={boundary}"}, "".join(
+            out
+        ).encode("utf-8")
+
+    _ROUTES = [
+        (r"/drive/v3/about", "GET", _about),
+        (r"/drive/v3/changes/startPageToken", "GET", _start_page_token),
+        (r"/drive/v3/changes", "GET", _list_changes),
+        (r"/drive/v3/files/([^/]+)", "GET", _get_file),
+        (r"/drive/v3/files/([^/]+)", "DELETE", _delete_file),
+        (r"/drive/v3/files", "GET", _list_files),
+        (r"/upload/drive/v3/files", "POST", _create_file),
+        (r"/drive/v3/files", "POST", _create_file),
+        (r"/drive/v3/files/([^/]+)/permissions", "POST", _create_permission),
+        (r"/v1/documents", "POST", _create_document),
+        (r"/v1/documents/([^/:]+)", "GET", _get_document),
+        (r"/v1/documents/([^/:]+):batchUpdate", "POST", _batch_update),
+        (r"/v1/courses/([^/]+)/courseWork", "GET", _list_course_work),
+        (r"/v1/courses/([^/]+)/courseWork/([^/]+)/studentSubmissions", "GET", _list_submissions),
+        (
+            r"/v1/courses/([^/]+)/courseWork/([^/]+)/studentSubmissions/([^/:]+):modifyAttachments",
+            "POST",
+            _modify_attachments,
+        ),
+        (
+            r"/v1/courses/([^/]+)/courseWork/([^/]+)/studentSubmissions/([^/:]+):turnIn",
+            "POST",
+            _turn_in,
+        ),
+    ]
@@ -0,0 +1,84 @@
+import base64
+import random
+
+
+# A small but valid PNG so generated notebooks carry realistic base64 payloads.
+_PNG_1PX = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+def fake_png(size: int, rng: random.Random) -> str:
+    padding = bytes(rng.getrandbits(8) for _ in range(max(0, size - len(_PNG_1PX))))
+    return base64.b64encode(_PNG_1PX + padding).decode("ascii")
+
+
+def make_notebook(
+    cells: int = 1000,
+    questions: int = 20,
+    image_every: int = 10,
+    image_bytes: int = 20_000,
+    output_lines: int = 5,
+    seed: int = 0,
+) -> dict:
+    rng = random.Random(seed)
+    nb_cells = []
+    per_question = max(1, cells // max(1, questions))
+    qn = 0
+    for i in range(cells):
+        if i % per_question == 0 and qn < questions:
+            qn += 1
+            nb_cells.append(
+                {
+                    "cell_type": "markdown",
+                    "metadata": {},
+                    "source": [f"## Question {qn}\n", "Explain what the code does.\n"],
+                }
+            )
+            continue
+        if i % 7 == 0:
+            nb_cells.append(
+                {
+                    "cell_type": "markdown",
+                    "metadata": {},
+                    "source": ["Because the loss goes down, the model learns.\n"],
+                }
+            )
+            continue
+        outputs = [
+            {
+                "output_type": "stream",
+                "name": "stdout",
+                "text": [f"step {i} line {j}: {rng.random():.6f}\n" for j in range(output_lines)],
+            }
+        ]
+        if image_every and i % image_every == 0:
+            outputs.append(
+                {
+                    "output_type": "display_data",
+                    "metadata": {},
+                    "data": {
+                        "image/png": fake_png(image_bytes, rng),
+                        "text/plain": ["<Figure size 640x480 with 1 Axes>"],
+                    },
+                }
+            )
+        nb_cells.append(
+            {
+                "cell_type": "code",
+                "execution_count": i,
+                "metadata": {},
+                "source": [
+                    "import numpy as np\n",
+                    f"x = np.linspace(0, {i}, 100)\n",
+                    "print(x.mean())\n",
+                ],
+                "outputs": outputs,
+            }
+        )
+    return {
+        "cells": nb_cells,
+        "metadata": {"kernelspec": {"name": "python3", "display_name": "Python 3"}},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }
@@ -0,0 +1,195 @@
+import atexit
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+
+DEFAULT_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+DEFAULT_MAX_USES = int(os.getenv("BROWSER_MAX_USES", "50"))
+
+
+class _BrowserSlot:
+    # Playwright's sync API is bound to the thread that started it, so every
+    # browser lives on its own thread and all work for it is queued there.
+    # It is a plain daemon thread rather than an executor: executors stop
+    # taking work when interpreter shutdown begins, before atexit handlers
+    # run, and the atexit handler still has to reach this thread to close
+    # the browser.
+    def __init__(self, index: int, max_uses: int, launch_args: dict):
+        self.index = index
+        self.max_uses = max_uses
+        self.launch_args = launch_args
+        self._tasks = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.playwright = None
+        self.browser = None
+        self.uses = 0
+
+    def _start(self):
+        if self.playwright is None:
+            # Imported here so processes that never take a screenshot skip it.
+            from playwright.sync_api import sync_playwright
+
+            self.playwright = sync_playwright().start()
+        self.browser = self.playwright.chromium.launch(**self.launch_args)
+        self.uses = 0
+
+    def _stop_browser(self):
+        if self.browser is not None:
+            try:
+                self.browser.close()
+            except Exception:
+                pass
+        self.browser = None
+
+    def _healthy(self) -> bool:
+        return self.browser is not None and self.browser.is_connected()
+
+    def _ensure(self):
+        if self.uses >= self.max_uses:
+            self._stop_browser()
+        if not self._healthy():
+            self._stop_browser()
+            self._start()
+
+    def _run(self, fn):
+        self._ensure()
+        context = self.browser.new_context()
+        try:
+            page = context.new_page()
+            return fn(page)
+        except Exception:
+            if not self._healthy():
+                # Crashed mid-job: relaunch once and retry on a fresh browser.
+                self._stop_browser()
+                self._start()
+                context = self.browser.new_context()
+                return fn(context.new_page())
+            raise
+        finally:
+            self.uses += 1
+            try:
+                context.close()
+            except Exception:
+                pass
+
+    def _loop(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            future, fn, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as exc:
+                future.set_exception(exc)
+
+    def _submit(self, fn, *args) -> Future:
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name=f"browser-{self.index}", daemon=True
+                )
+                self._thread.start()
+        future = Future()
+        self._tasks.put((future, fn, args))
+        return future
+
+    def run(self, fn):
+        return self._submit(self._run, fn).result()
+
+    def warm(self):
+        self._submit(self._ensure).result()
+
+    def _shutdown(self):
+        self._stop_browser()
+        if self.playwright is not None:
+            try:
+                self.playwright.stop()
+            except Exception:
+                pass
+        self.playwright = None
+
+    def close(self):
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._tasks.put((Future(), self._shutdown, ()))
+        self._tasks.put(None)
+        thread.join()
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        size: int = DEFAULT_POOL_SIZE,
+        max_uses: int = DEFAULT_MAX_USES,
+        launch_args: dict = None,
+    ):
+        self.size = max(1, size)
+        self._slots = [
+            _BrowserSlot(i, max_uses, launch_args or {}) for i in range(self.size)
+        ]
+        self._free = queue.Queue()
+        for slot in self._slots:
+            self._free.put(slot)
+        self._closed = False
+
+    def run(self, fn, timeout: float = None):
+        if self._closed:
+            raise RuntimeError("Browser pool is closed.")
+        try:
+            slot = self._free.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError("Timed out waiting for a free browser.")
+        try:
+            return slot.run(fn)
+        finally:
+            self._free.put(slot)
+
+    def warm(self):
+        for slot in self._slots:
+            slot.warm()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for slot in self._slots:
+            try:
+                slot.close()
+            except Exception:
+                pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_pid = None
+
+
+def get_browser_pool() -> BrowserPool:
+    global _pool, _pool_pid
+    # A pool inherited across fork() belongs to the parent; start a fresh one.
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = BrowserPool()
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def close_browser_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+atexit.register(close_browser_pool)
@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from google.auth.exceptions import RefreshError
+from google.oauth2.credentials import Credentials
+
+from storage import write_atomic
+
+
+# Refresh tokens this long before they expire so requests never wait on it.
+REFRESH_MARGIN = timedelta(minutes=5)
+REFRESH_CHECK_INTERVAL = 60
+
+
+def _needs_refresh(creds: Credentials) -> bool:
+    if not creds.refresh_token:
+        return False
+    if not creds.token or creds.expiry is None:
+        return not creds.valid
+    # google-auth stores expiry as a naive UTC datetime.
+    return creds.expiry - datetime.utcnow() < REFRESH_MARGIN
+
+
+class FileTokenStorage:
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def write(self, data: str):
+        write_atomic(self.path, data)
+
+    def delete(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class CredentialManager:
+    # storage is a token.json path or any object with read/write/delete.
+    def __init__(self, storage, scopes: list, background_refresh: bool = True):
+        if isinstance(storage, str):
+            storage = FileTokenStorage(storage)
+        self.storage = storage
+        self.scopes = scopes
+        self.background_refresh = background_refresh
+        self._creds = None
+        self._saved_json = None
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._refresher = None
+        self._refresher_pid = None
+        self._stop = threading.Event()
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        data = self.storage.read()
+        if not data:
+            return
+        try:
+            self._creds = Credentials.from_authorized_user_info(json.loads(data), self.scopes)
+        except ValueError:
+            return
+        self._saved_json = self._creds.to_json()
+
+    def _persist(self):
+        if self._creds is None:
+            return
+        data = self._creds.to_json()
+        if data == self._saved_json:
+            return
+        self.storage.write(data)
+        self._saved_json = data
+
+    def _refresh(self) -> bool:
+        # Pulls in requests/urllib3; only needed once a token expires.
+        from google.auth.transport.requests import Request
+
+        try:
+            self._creds.refresh(Request())
+        except RefreshError:
+            self._creds = None
+            return False
+        self._persist()
+        return True
+
+    def get(self):
+        with self._lock:
+            self._load()
+            creds = self._creds
+            if creds is None:
+                return None
+            if not creds.valid:
+                if not creds.refresh_token or not self._refresh():
+                    return None
+            self._ensure_refresher()
+            return self._creds
+
+    def set(self, creds: Credentials):
+        with self._lock:
+            self._loaded = True
+            self._creds = creds
+            self._persist()
+            self._ensure_refresher()
+
+    def clear(self):
+        with self._lock:
+            self._loaded = True
+            self._creds = None
+            self._saved_json = None
+            self.storage.delete()
+
+    def is_logged_in(self) -> bool:
+        if not self._loaded:
+            with self._lock:
+                self._load()
+        # Deliberately lock-free: a background refresh may hold the lock while
+        # it talks to Google, and status checks must not wait on that.
+        creds = self._creds
+        return bool(creds and (creds.valid or creds.refresh_token))
+
+    def refresh_if_due(self):
+        with self._lock:
+            if self._creds is None or not _needs_refresh(self._creds):
+                return
+            try:
+                self._refresh()
+            except Exception:
+                # Network hiccup; the next tick (or get()) will retry.
+                pass
+
+    def _ensure_refresher(self):
+        if not self.background_refresh:
+            return
+        if self._refresher is not None and self._refresher_pid == os.getpid():
+            return
+        self._refresher = threading.Thread(
+            target=self._refresh_loop, name="credential-refresh", daemon=True
+        )
+        self._refresher_pid = os.getpid()
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(REFRESH_CHECK_INTERVAL):
+            self.refresh_if_due()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,23 @@
+import os
+import threading
+
+
+# Gunicorn loads this file automatically from the working directory.
+# Importing the app once in the master means a worker forked (or re-forked
+# after a crash) starts with the modules already in memory. Set
+# GUNICORN_PRELOAD=0 to import in each worker instead.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+# Set WARM_BROWSER=0 to launch Chromium on the first screenshot instead.
+warm_browser = os.getenv("WARM_BROWSER", "1") != "0"
+
+
+def post_fork(server, worker):
+    # The rest of the warm-up (discovery documents, nbconvert's first render,
+    # Chromium) runs in each worker, in the background so it starts serving
+    # right away. Doing it in the master would hold up the first worker, and
+    # Chromium does not survive fork anyway.
+    from lab_agent import warm_up
+
+    threading.Thread(
+        target=warm_up, kwargs={"browser": warm_browser}, name="warm-up", daemon=True
+    ).start()
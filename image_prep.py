@@ -0,0 +1,104 @@
+import atexit
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+# Size every image is shown at in the Doc (see insertInlineImage).
+DISPLAY_WIDTH_PT = 450
+DISPLAY_HEIGHT_PT = 300
+# Pixels per point kept so images stay sharp on high-DPI screens.
+DEFAULT_SCALE = float(os.getenv("IMAGE_SCALE", "2"))
+DEFAULT_QUALITY = 85
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Docs can only embed PNG, JPEG and GIF, so WebP is not offered.
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg"}
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg"}
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def prepare_image(
+    raw: bytes,
+    fmt: str = "png",
+    quality: int = DEFAULT_QUALITY,
+    scale: float = DEFAULT_SCALE,
+) -> tuple:
+    # Returns (bytes, mimetype). Anything Pillow cannot read is passed through.
+    from PIL import Image
+
+    try:
+        img = Image.open(io.BytesIO(raw))
+        img.load()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return raw, "image/png"
+
+    box = (round(DISPLAY_WIDTH_PT * scale), round(DISPLAY_HEIGHT_PT * scale))
+    resized = img.width > box[0] or img.height > box[1]
+    if resized:
+        img.thumbnail(box, Image.LANCZOS)
+
+    # Saving without info/exif/icc arguments drops the source metadata.
+    buf = io.BytesIO()
+    if fmt == "jpeg":
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(buf, format="JPEG", quality=quality, optimize=True)
+    else:
+        if img.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+            img = img.convert("RGBA")
+        img.save(buf, format="PNG", optimize=True)
+    out = buf.getvalue()
+
+    # A small image that does not shrink on re-encoding is sent as is.
+    if not resized and len(out) >= len(raw):
+        return raw, "image/png"
+    return out, MIME_TYPES[fmt]
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn: forking a process that runs job and browser threads can
+            # copy held locks into the child.
+            _pool = ProcessPoolExecutor(
+                max_workers=IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def close_image_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def prepare_image_in_pool(raw: bytes, **settings) -> tuple:
+    if IMAGE_WORKERS <= 1:
+        return prepare_image(raw, **settings)
+    try:
+        return get_image_pool().submit(prepare_image, raw, **settings).result()
+    except BrokenProcessPool:
+        close_image_pool()
+        return prepare_image(raw, **settings)
+
+
+atexit.register(close_image_pool)
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Finished jobs are kept this long so clients can still read the result.
+JOB_TTL = 60 * 60
+
+
+class Job:
+    def __init__(self, owner: str = None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.status = "queued"
+        self.stage = None
+        self.stages = []
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def report(self, stage: str):
+        now = time.time()
+        with self._lock:
+            if self.stages and self.stages[-1]["duration"] is None:
+                self.stages[-1]["duration"] = now - self.stages[-1]["started"]
+            self.stage = stage
+            self.stages.append({"name": stage, "started": now, "duration": None})
+
+    def _finish(self, status: str, result=None, error: str = None):
+        now = time.time()
+        with self._lock:
+            if self.stages and self.stages[-1]["duration"] is None:
+                self.stages[-1]["duration"] = now - self.stages[-1]["started"]
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished = now
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "stages": [dict(s) for s in self.stages],
+                "result": self.result,
+                "error": self.error,
+                "created": self.created,
+                "finished": self.finished,
+            }
+
+
+class JobManager:
+    def __init__(self, max_workers: int = JOB_WORKERS, ttl: float = JOB_TTL):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="job"
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, owner: str = None, **kwargs) -> Job:
+        job = Job(owner)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn, args, kwargs):
+        with job._lock:
+            job.status = "running"
+        try:
+            result = fn(*args, progress=job.report, **kwargs)
+        except Exception as exc:
+            traceback.print_exc()
+            job._finish("error", error=str(exc))
+            return
+        job._finish("done", result=result)
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and job.finished < cutoff:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
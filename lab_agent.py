@@ -1,20 +1,43 @@
 import argparse
 import base64
+import hashlib
+import html
 import io
 import json
 import os
 import re
-import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# nbconvert, nbformat, Playwright, Pillow, the OAuth flow and the discovery
+# client are imported where they are used, so `--help`, the listing
+# endpoints and a server worker start without paying for all of them.
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
-import nbformat
-from nbconvert import HTMLExporter
-from playwright.sync_api import sync_playwright
+from googleapiclient.errors import HttpError
+
+from browser_pool import get_browser_pool
+from credentials_store import CredentialManager
+from image_prep import (
+    DEFAULT_QUALITY,
+    DEFAULT_SCALE,
+    DISPLAY_HEIGHT_PT,
+    DISPLAY_WIDTH_PT,
+    EXTENSIONS,
+    MIME_TYPES,
+    prepare_image_in_pool,
+)
+from listing_cache import ListingCache
+from metrics import BYTES_DOWNLOADED, BYTES_UPLOADED, RunTimer, observe_api_call
+from notebook_cache import get_notebook_cache, notebook_revision
+from notebook_stream import NotebookStreamParser
+from retry import MAX_RETRIES, execute_with_retry
+from run_state import RunStateStore, question_fingerprint, run_key, settings_fingerprint
+from storage import write_atomic
+from token_store import SessionTokenStore
+from upload_cache import UploadCache, get_upload_cache, image_digest
 
 
 SCOPES = [
@@ -29,155 +52,369 @@ QUESTION_PATTERNS = [
     re.compile(r"\bQ(?:uestion)?\s*([0-9]+)\b", re.IGNORECASE),
 ]
 
+_ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+_OUTPUT_CSS = """
+body { margin: 0; padding: 8px; background: #fff; width: 900px; }
+.output_area { padding: 6px 8px; margin-bottom: 12px; font-family: Menlo, Consolas, monospace; font-size: 13px; color: #212121; }
+.output_area pre { margin: 0 0 4px; white-space: pre-wrap; word-break: break-word; }
+.output_area .stderr { background: #fdd; }
+.output_area .error { background: #fdd; color: #b22b31; }
+.output_area img, .output_area svg { max-width: 100%; display: block; }
+.output_area table { border-collapse: collapse; font-size: 12px; }
+.output_area th, .output_area td { border: 1px solid #ccc; padding: 2px 6px; text-align: right; }
+"""
+
+OUTPUT_SELECTORS = [".output_area", ".output", ".jp-OutputArea"]
+
+# One evaluate() collects every output box in page coordinates.
+_OUTPUT_BOXES_JS = """(selectors) => {
+  for (const selector of selectors) {
+    const els = document.querySelectorAll(selector);
+    if (els.length) {
+      return Array.from(els, (el) => {
+        const r = el.getBoundingClientRect();
+        return [r.left + window.scrollX, r.top + window.scrollY, r.width, r.height];
+      });
+    }
+  }
+  return [];
+}"""
+
+# Keep each full-page capture well under Chromium's texture size limit.
+MAX_TILE_HEIGHT = 8000
+
+DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+MAX_NOTEBOOK_BYTES = 256 * 1024 * 1024
+
+# One upload pool per process, shared by every run, so the threads (and the
+# TLS connections they keep in _thread_state) outlive any single run.
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "8"))
+BULK_WORKERS = 4
+# Upper bound on the workers a web client may ask for in one bulk job; each
+# worker is a full pipeline with its own uploads and a share of the browsers.
+MAX_BULK_WORKERS = int(os.getenv("MAX_BULK_WORKERS", str(BULK_WORKERS)))
+COLAB_MIME_TYPE = "application/vnd.google.colaboratory"
+MAX_BATCH_REQUESTS = 500
+
+CODE_FONT = "Roboto Mono"
+NAMED_STYLES = {"title": "TITLE", "heading": "HEADING_2"}
+MAX_BATCH_BYTES = 2 * 1024 * 1024
+# Drive rejects batch requests with more than 100 calls.
+PERMISSION_BATCH_SIZE = 100
+# Changes-feed pages read when revalidating a cached folder listing before
+# giving up and listing the folder again.
+MAX_CHANGE_PAGES = 3
+
+SERVICE_VERSIONS = [("drive", "v3"), ("docs", "v1"), ("classroom", "v1")]
+# Credentials whose API clients (and per-thread authorized transports) are
+# kept; the least recently used are rebuilt on their next call.
+MAX_CACHED_SERVICES = int(os.getenv("SERVICE_CACHE_SIZE", "100"))
+
+credential_manager = CredentialManager("token.json", SCOPES)
+token_store = SessionTokenStore(SCOPES)
+run_states = RunStateStore()
+listing_cache = ListingCache()
+
+_thread_state = threading.local()
+_discovery_docs = {}
+_services = OrderedDict()
+_services_lock = threading.Lock()
+_account_ids = OrderedDict()
+_account_ids_lock = threading.Lock()
+_upload_pool = None
+_upload_pool_pid = None
+_upload_pool_lock = threading.Lock()
+
 
 def load_config(path: str) -> dict:
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def get_credentials() -> Credentials:
-    creds = None
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            if os.getenv("WEB_OAUTH") == "1":
-                raise RuntimeError("Not authenticated. Please login in the UI.")
-            flow = InstalledAppFlow.from_client_secrets_file(
-                "credentials.json", SCOPES
-            )
-            creds = flow.run_local_server(port=0)
-        with open("token.json", "w", encoding="utf-8") as f:
-            f.write(creds.to_json())
+def get_credentials(session_id: str = None) -> Credentials:
+    # Web users each have their own token in token_store. The shared
+    # token.json is only used by the CLI and single-user local runs.
+    if session_id:
+        creds = token_store.get(session_id)
+        if creds is not None:
+            return creds
+    if os.getenv("WEB_OAUTH") == "1":
+        raise RuntimeError("Not authenticated. Please login in the UI.")
+    creds = credential_manager.get()
+    if creds is not None:
+        return creds
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
+    creds = flow.run_local_server(port=0)
+    credential_manager.set(creds)
     return creds
 
 
+def _credential_key(creds: Credentials):
+    return (getattr(creds, "client_id", None), creds.refresh_token or creds.token)
+
+
+def _discovery_doc(name: str, version: str) -> dict:
+    key = (name, version)
+    doc = _discovery_docs.get(key)
+    if doc is None:
+        from googleapiclient.discovery_cache import get_static_doc
+
+        doc = json.loads(get_static_doc(name, version))
+        _discovery_docs[key] = doc
+    return doc
+
+
+def _authorized_http(holder: dict):
+    # httplib2 is not thread-safe, so each thread keeps one raw Http (and its
+    # open TLS connections) and wraps it per credential.
+    import google_auth_httplib2
+    import httplib2
+
+    raw = getattr(_thread_state, "http", None)
+    if raw is None:
+        raw = httplib2.Http()
+        _thread_state.http = raw
+        _thread_state.authorized = OrderedDict()
+    creds = holder["creds"]
+    key = _credential_key(creds)
+    authorized = _thread_state.authorized
+    http = authorized.get(key)
+    if http is None or http.credentials is not creds:
+        http = google_auth_httplib2.AuthorizedHttp(creds, http=raw)
+        authorized[key] = http
+        while len(authorized) > MAX_CACHED_SERVICES:
+            authorized.popitem(last=False)
+    authorized.move_to_end(key)
+    return http
+
+
+def _request_builder(holder: dict):
+    from googleapiclient.http import HttpRequest
+
+    def build_request(http, *args, **kwargs):
+        return HttpRequest(_authorized_http(holder), *args, **kwargs)
+
+    return build_request
+
+
 def get_services(creds: Credentials):
-    drive_service = build("drive", "v3", credentials=creds)
-    docs_service = build("docs", "v1", credentials=creds)
-    classroom_service = build("classroom", "v1", credentials=creds)
-    return drive_service, docs_service, classroom_service
+    from googleapiclient.discovery import build_from_document
+
+    key = _credential_key(creds)
+    with _services_lock:
+        entry = _services.get(key)
+        if entry is not None:
+            _services.move_to_end(key)
+            cached = entry["holder"]["creds"]
+            if cached is not creds and creds.token != cached.token:
+                if cached.expiry is None or (
+                    creds.expiry is not None and creds.expiry > cached.expiry
+                ):
+                    entry["holder"]["creds"] = creds
+            return entry["services"]
+
+        holder = {"creds": creds}
+        services = tuple(
+            build_from_document(
+                _discovery_doc(name, version),
+                credentials=creds,
+                requestBuilder=_request_builder(holder),
+            )
+            for name, version in SERVICE_VERSIONS
+        )
+        _services[key] = {"holder": holder, "services": services}
+        while len(_services) > MAX_CACHED_SERVICES:
+            _services.popitem(last=False)
+        return services
+
+
+def invalidate_services(creds: Credentials = None):
+    with _services_lock:
+        if creds is None:
+            _services.clear()
+        else:
+            _services.pop(_credential_key(creds), None)
 
 
-def download_notebook(drive_service, file_id: str) -> dict:
+def download_notebook(
+    drive_service,
+    file_id: str,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    max_bytes: int = MAX_NOTEBOOK_BYTES,
+) -> dict:
     request = drive_service.files().get_media(
         fileId=file_id, supportsAllDrives=True
     )
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
+    from googleapiclient.http import MediaIoBaseDownload
+
+    parser = NotebookStreamParser(max_bytes=max_bytes)
+    downloader = MediaIoBaseDownload(parser, request, chunksize=chunk_size)
     done = False
-    while not done:
-        _, done = downloader.next_chunk()
-    fh.seek(0)
-    return json.loads(fh.read().decode("utf-8"))
+    started = time.perf_counter()
+    try:
+        while not done:
+            status, done = downloader.next_chunk(num_retries=MAX_RETRIES)
+            if max_bytes is not None and status.total_size and status.total_size > max_bytes:
+                raise RuntimeError(
+                    f"Notebook is larger than the {max_bytes // (1024 * 1024)} MB limit."
+                )
+    finally:
+        observe_api_call(
+            "drive.files.get_media",
+            time.perf_counter() - started,
+            "ok" if done else "error",
+        )
+        BYTES_DOWNLOADED.inc(parser.bytes_seen)
+    return parser.close()
+
+
+def _combine_patterns(patterns: list):
+    parts = []
+    for pattern in patterns:
+        flags = "i" if pattern.flags & re.IGNORECASE else ""
+        parts.append(f"(?{flags}:{pattern.pattern})" if flags else f"(?:{pattern.pattern})")
+    return re.compile("|".join(parts))
+
+
+# One pass over the text instead of one search per pattern. With several
+# patterns the leftmost match wins.
+_QUESTION_RE = _combine_patterns(QUESTION_PATTERNS)
 
 
 def find_question_number(text: str):
-    for pattern in QUESTION_PATTERNS:
-        match = pattern.search(text)
-        if match:
-            return match.group(1)
+    match = _QUESTION_RE.search(text)
+    if match is None:
+        return None
+    for group in match.groups():
+        if group is not None:
+            return group
     return None
 
 
+def _new_item(code: str, reasoning_parts: list) -> dict:
+    # "outputs" collects text chunks while parsing and is joined once at the end.
+    item = {"code": code, "outputs": []}
+    if reasoning_parts:
+        item["reasoning"] = "\n".join(reasoning_parts)
+    return item
+
+
 def parse_notebook(nb: dict, auto_number: bool):
-    questions = {}
+    items_by_q = {}
     current_q = None
     screenshot_map = []
     auto_index = 1
-    pending_reasoning = None
+    reasoning_parts = []
 
-    for cell in nb.get("cells", []):
+    for cell_index, cell in enumerate(nb.get("cells", [])):
         cell_type = cell.get("cell_type")
-        source = "".join(cell.get("source", []))
+        source = cell.get("source") or ""
+        if source.__class__ is not str:
+            source = "".join(source)
 
         if cell_type == "markdown":
             qn = find_question_number(source)
             if qn:
                 current_q = qn
-                questions.setdefault(current_q, {"items": []})
-                pending_reasoning = None
+                items_by_q.setdefault(current_q, [])
+                reasoning_parts = []
                 continue
             if current_q:
                 text = source.strip()
                 if text:
-                    if pending_reasoning:
-                        pending_reasoning = (pending_reasoning + "\n" + text).strip()
-                    else:
-                        pending_reasoning = text
+                    reasoning_parts.append(text)
             continue
 
-        if cell_type == "code":
-            if current_q is None:
-                qn = find_question_number(source)
-                if qn:
-                    current_q = qn
-            if current_q is None:
-                # Try to detect question number from outputs
-                for out in cell.get("outputs", []):
-                    out_type = out.get("output_type")
-                    if out_type == "stream":
-                        text = "".join(out.get("text", []))
-                        qn = find_question_number(text)
-                        if qn:
-                            current_q = qn
-                            break
-                    elif out_type in ("execute_result", "display_data"):
-                        data = out.get("data", {})
-                        if "text/plain" in data:
-                            text = "".join(data["text/plain"])
-                            qn = find_question_number(text)
-                            if qn:
-                                current_q = qn
-                                break
-                if current_q is None and auto_number:
-                    current_q = str(auto_index)
-                    auto_index += 1
-                if current_q is None:
+        if cell_type != "code":
+            continue
+
+        if current_q is None:
+            current_q = find_question_number(source)
+
+        # Single scan of the outputs: collect text and image, and look for a
+        # question number only while we still need one.
+        outputs = cell.get("outputs") or []
+        texts = None
+        image_b64 = None
+        output_q = None
+        for out in outputs:
+            out_type = out.get("output_type")
+            if out_type == "stream":
+                text = out.get("text") or ""
+            elif out_type == "execute_result" or out_type == "display_data":
+                data = out.get("data") or {}
+                if "image/png" in data:
+                    image_b64 = data["image/png"]
+                if "text/plain" not in data:
                     continue
-            questions.setdefault(current_q, {"items": []})
-            if source.strip():
-                item = {"code": source, "outputs": ""}
-                if pending_reasoning:
-                    item["reasoning"] = pending_reasoning
-                    pending_reasoning = None
-                questions[current_q]["items"].append(item)
-
-            outputs = cell.get("outputs", [])
-            if outputs:
-                if not questions[current_q]["items"]:
-                    item = {"code": "", "outputs": ""}
-                    if pending_reasoning:
-                        item["reasoning"] = pending_reasoning
-                        pending_reasoning = None
-                    questions[current_q]["items"].append(item)
-                item_index = len(questions[current_q]["items"]) - 1
-                screenshot_map.append((current_q, item_index))
-
-            for out in outputs:
-                out_type = out.get("output_type")
-                if out_type == "stream":
-                    text = "".join(out.get("text", []))
-                    if text.strip():
-                        if questions[current_q]["items"]:
-                            questions[current_q]["items"][-1]["outputs"] += text
-                elif out_type in ("execute_result", "display_data"):
-                    data = out.get("data", {})
-                    if "text/plain" in data:
-                        text = "".join(data["text/plain"])
-                        if text.strip():
-                            if questions[current_q]["items"]:
-                                questions[current_q]["items"][-1]["outputs"] += text
-                    if "image/png" in data:
-                        if questions[current_q]["items"]:
-                            questions[current_q]["items"][-1]["image_b64"] = data["image/png"]
+                text = data["text/plain"]
+            else:
+                continue
+            if text.__class__ is not str:
+                text = "".join(text)
+            if current_q is None and output_q is None:
+                output_q = find_question_number(text)
+            if text.strip():
+                if texts is None:
+                    texts = [text]
+                else:
+                    texts.append(text)
+
+        if current_q is None:
+            current_q = output_q
+            if current_q is None and auto_number:
+                current_q = str(auto_index)
+                auto_index += 1
+            if current_q is None:
+                continue
+
+        items = items_by_q.get(current_q)
+        if items is None:
+            items = items_by_q[current_q] = []
+        if source.strip():
+            items.append(_new_item(source, reasoning_parts))
+            if reasoning_parts:
+                reasoning_parts = []
+
+        if outputs:
+            if not items:
+                items.append(_new_item("", reasoning_parts))
+                if reasoning_parts:
+                    reasoning_parts = []
+            screenshot_map.append((current_q, len(items) - 1, cell_index))
+            item = items[-1]
+            if texts is not None:
+                item["outputs"].extend(texts)
+            if image_b64 is not None:
+                item["image_b64"] = image_b64
 
+    questions = {}
+    for qn, items in items_by_q.items():
+        for item in items:
+            outputs = item["outputs"]
+            item["outputs"] = outputs[0] if len(outputs) == 1 else "".join(outputs)
+        questions[qn] = {"items": items}
     return questions, screenshot_map
 
 
+def _html_exporter():
+    # Building an HTMLExporter loads its Jinja templates; keep one per thread
+    # instead of paying for that on every render.
+    exporter = getattr(_thread_state, "html_exporter", None)
+    if exporter is None:
+        from nbconvert import HTMLExporter
+
+        exporter = HTMLExporter()
+        _thread_state.html_exporter = exporter
+    return exporter
+
+
 def export_notebook_html(nb: dict) -> str:
+    import nbformat
+
     # Normalize cell sources to strings for nbconvert
     for cell in nb.get("cells", []):
         src = cell.get("source", "")
@@ -186,195 +423,705 @@ def export_notebook_html(nb: dict) -> str:
         elif src is None:
             cell["source"] = ""
     nb_node = nbformat.from_dict(nb)
-    exporter = HTMLExporter()
-    body, _ = exporter.from_notebook_node(nb_node)
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".html")
-    tmp.write(body.encode("utf-8"))
-    tmp.close()
-    return tmp.name
-
-
-def capture_output_screenshots(html_path: str) -> list:
-    screenshots = []
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page()
-        page.goto(f"file://{html_path}", wait_until="networkidle")
-
-        elements = page.query_selector_all(".output_area")
-        if not elements:
-            elements = page.query_selector_all(".output")
-        if not elements:
-            elements = page.query_selector_all(".jp-OutputArea")
-
-        for i, el in enumerate(elements):
+    body, _ = _html_exporter().from_notebook_node(nb_node)
+    return body
+
+
+def _render_output(out: dict) -> str:
+    out_type = out.get("output_type")
+    if out_type == "stream":
+        text = _ANSI_RE.sub("", "".join(out.get("text") or ""))
+        css = "stream stderr" if out.get("name") == "stderr" else "stream"
+        return f'<pre class="{css}">{html.escape(text)}</pre>'
+    if out_type == "error":
+        text = _ANSI_RE.sub("", "\n".join(out.get("traceback") or []))
+        if not text:
+            text = f"{out.get('ename', 'Error')}: {out.get('evalue', '')}"
+        return f'<pre class="error">{html.escape(text)}</pre>'
+    if out_type not in ("execute_result", "display_data"):
+        return ""
+    data = out.get("data") or {}
+    for mime in ("image/png", "image/jpeg"):
+        if mime in data:
+            payload = "".join(data[mime]).replace("\n", "")
+            return f'<img src="data:{mime};base64,{payload}">'
+    if "image/svg+xml" in data:
+        return "".join(data["image/svg+xml"])
+    if "text/html" in data:
+        return f'<div class="html">{"".join(data["text/html"])}</div>'
+    if "text/plain" in data:
+        text = _ANSI_RE.sub("", "".join(data["text/plain"]))
+        return f"<pre>{html.escape(text)}</pre>"
+    return ""
+
+
+def render_outputs_html(nb: dict, screenshot_map: list) -> str:
+    # Only the outputs that will be screenshotted, one .output_area per
+    # screenshot_map entry, so element i always belongs to entry i.
+    cells = nb.get("cells", [])
+    parts = [
+        '<!doctype html><html><head><meta charset="utf-8"><style>',
+        _OUTPUT_CSS,
+        "</style></head><body>",
+    ]
+    for _, _, cell_index in screenshot_map:
+        parts.append('<div class="output_area">')
+        for out in cells[cell_index].get("outputs") or []:
+            parts.append(_render_output(out))
+        parts.append("</div>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def _crop_tiles(page, emit):
+    from PIL import Image
+
+    boxes = [
+        box for box in page.evaluate(_OUTPUT_BOXES_JS, OUTPUT_SELECTORS)
+        if box[2] >= 1 and box[3] >= 1
+    ]
+    i = 0
+    while i < len(boxes):
+        x, y, w, h = boxes[i]
+        left, top, right, bottom = x, y, x + w, y + h
+        j = i + 1
+        while j < len(boxes):
+            x, y, w, h = boxes[j]
+            if max(bottom, y + h) - min(top, y) > MAX_TILE_HEIGHT:
+                break
+            left, top = min(left, x), min(top, y)
+            right, bottom = max(right, x + w), max(bottom, y + h)
+            j += 1
+
+        tile = Image.open(
+            io.BytesIO(
+                page.screenshot(
+                    full_page=True,
+                    clip={"x": left, "y": top, "width": right - left, "height": bottom - top},
+                )
+            )
+        )
+        scale = tile.width / (right - left)
+        for x, y, w, h in boxes[i:j]:
+            region = (
+                round((x - left) * scale),
+                round((y - top) * scale),
+                round((x + w - left) * scale),
+                round((y + h - top) * scale),
+            )
+            buf = io.BytesIO()
+            tile.crop(region).save(buf, format="PNG", compress_level=3)
+            emit(buf.getvalue())
+        i = j
+
+
+def capture_output_screenshots(
+    page_html: str,
+    pool=None,
+    wait_until: str = "load",
+    crop: bool = False,
+    on_screenshot=None,
+) -> list:
+    # on_screenshot(index, png) is called from the browser thread as each
+    # output is captured, so consumers can start on it before capture ends.
+    def capture(page):
+        screenshots = []
+
+        def emit(png: bytes):
+            screenshots.append(png)
+            if on_screenshot is not None:
+                on_screenshot(len(screenshots) - 1, png)
+
+        page.set_content(page_html, wait_until=wait_until)
+        if crop:
+            _crop_tiles(page, emit)
+            return screenshots
+
+        elements = []
+        for selector in OUTPUT_SELECTORS:
+            elements = page.query_selector_all(selector)
+            if elements:
+                break
+
+        for el in elements:
             try:
-                path = tempfile.mkstemp(prefix=f"output-{i}-", suffix=".png")[1]
-                el.screenshot(path=path)
-                screenshots.append(path)
+                png = el.screenshot()
             except Exception:
                 continue
+            emit(png)
+        return screenshots
 
-        browser.close()
+    if pool is None:
+        pool = get_browser_pool()
+    return pool.run(capture)
 
-    return screenshots
 
+def create_doc(docs_service, title: str) -> tuple:
+    # Returns (document_id, revision_id); the revision pins the first write.
+    doc = execute_with_retry(docs_service.documents().create(body={"title": title}))
+    return doc["documentId"], doc.get("revisionId")
 
-def create_doc(docs_service, title: str) -> str:
-    doc = docs_service.documents().create(body={"title": title}).execute()
-    return doc["documentId"]
 
-
-def upload_image(drive_service, image_b64: str) -> str:
-    raw = base64.b64decode(image_b64)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp:
-        tmp.write(raw)
-        tmp_path = tmp.name
-
-    media = MediaFileUpload(tmp_path, mimetype="image/png")
-    file_metadata = {"name": f"lab-evidence-{datetime.utcnow().isoformat()}.png"}
-    created = drive_service.files().create(
-        body=file_metadata, media_body=media, fields="id", supportsAllDrives=True
-    ).execute()
-    os.unlink(tmp_path)
+def chunk_requests(
+    requests: list,
+    max_requests: int = MAX_BATCH_REQUESTS,
+    max_bytes: int = MAX_BATCH_BYTES,
+):
+    chunk = []
+    size = 0
+    for request in requests:
+        request_size = len(json.dumps(request))
+        if chunk and (len(chunk) >= max_requests or size + request_size > max_bytes):
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(request)
+        size += request_size
+    if chunk:
+        yield chunk
+
+
+def batch_update_doc(docs_service, doc_id: str, requests: list, revision_id: str = None):
+    # Chunks are applied in order, so each request still sees every earlier
+    # one applied and the precomputed indices stay valid. Each chunk is pinned
+    # to the revision the previous write produced (the first one to the
+    # revision passed in), so a retried chunk that already landed is rejected
+    # instead of applied twice. Without a starting revision the first chunk
+    # cannot be pinned.
+    for chunk in chunk_requests(requests):
+        body = {"requests": chunk}
+        if revision_id:
+            body["writeControl"] = {"requiredRevisionId": revision_id}
+        response = execute_with_retry(
+            docs_service.documents().batchUpdate(documentId=doc_id, body=body)
+        )
+        revision_id = response.get("writeControl", {}).get("requiredRevisionId")
+    return revision_id
+
+
+def upload_image_bytes(
+    drive_service, raw: bytes, prefix: str = "lab-evidence", mimetype: str = "image/png"
+) -> str:
+    from googleapiclient.http import MediaIoBaseUpload
+
+    BYTES_UPLOADED.inc(len(raw))
+    media = MediaIoBaseUpload(io.BytesIO(raw), mimetype=mimetype)
+    extension = EXTENSIONS.get(mimetype, "png")
+    file_metadata = {"name": f"{prefix}-{datetime.utcnow().isoformat()}.{extension}"}
+    created = execute_with_retry(
+        drive_service.files().create(
+            body=file_metadata, media_body=media, fields="id", supportsAllDrives=True
+        )
+    )
     return created["id"]
 
 
-def upload_image_file(drive_service, path: str) -> str:
-    media = MediaFileUpload(path, mimetype="image/png")
-    file_metadata = {"name": f"lab-evidence-shot-{datetime.utcnow().isoformat()}.png"}
-    created = drive_service.files().create(
-        body=file_metadata, media_body=media, fields="id", supportsAllDrives=True
-    ).execute()
-    return created["id"]
+def upload_image(drive_service, image_b64: str) -> str:
+    return upload_image_bytes(drive_service, base64.b64decode(image_b64))
 
 
 def maybe_share_file(drive_service, file_id: str):
-    drive_service.permissions().create(
-        fileId=file_id,
-        body={"type": "anyone", "role": "reader"},
-        supportsAllDrives=True,
-    ).execute()
+    execute_with_retry(
+        drive_service.permissions().create(
+            fileId=file_id,
+            body={"type": "anyone", "role": "reader"},
+            supportsAllDrives=True,
+        )
+    )
 
 
-def build_doc_requests(questions: dict, drive_service, share_images: bool):
-    requests = []
-    index = 1
+def share_files(drive_service, file_ids: list) -> set:
+    failed = set()
 
-    def add_text(txt: str):
-        nonlocal index
-        requests.append({"insertText": {"location": {"index": index}, "text": txt}})
-        index += len(txt)
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            failed.add(request_id)
 
-    add_text("Lab Evidence\n\n")
+    for start in range(0, len(file_ids), PERMISSION_BATCH_SIZE):
+        batch = drive_service.new_batch_http_request(callback=on_response)
+        for file_id in file_ids[start : start + PERMISSION_BATCH_SIZE]:
+            batch.add(
+                drive_service.permissions().create(
+                    fileId=file_id,
+                    body={"type": "anyone", "role": "reader"},
+                    supportsAllDrives=True,
+                ),
+                request_id=file_id,
+            )
+        try:
+            execute_with_retry(batch)
+        except Exception:
+            failed.update(file_ids[start : start + PERMISSION_BATCH_SIZE])
 
-    for qn in sorted(questions.keys(), key=lambda x: int(x)):
-        q = questions[qn]
-        add_text(f"Question {qn}\n")
-        add_text("=" * 40 + "\n")
-
-        items = q.get("items", [])
-        for i, item in enumerate(items, start=1):
-            add_text(f"Code {i}:\n")
-            for line in item["code"].strip().splitlines():
-                add_text(f"    {line}\n")
-            add_text("\n")
+    # Calls rejected inside a batch (typically rate limits) get one more
+    # chance each, with the usual backoff.
+    for file_id in list(failed):
+        try:
+            maybe_share_file(drive_service, file_id)
+        except Exception:
+            continue
+        failed.discard(file_id)
+    return failed
+
+
+def get_upload_pool() -> ThreadPoolExecutor:
+    global _upload_pool, _upload_pool_pid
+    # A pool inherited across fork() has no threads behind it; start a fresh one.
+    if _upload_pool is not None and _upload_pool_pid == os.getpid():
+        return _upload_pool
+    with _upload_pool_lock:
+        if _upload_pool is None or _upload_pool_pid != os.getpid():
+            _upload_pool = ThreadPoolExecutor(
+                max_workers=max(1, UPLOAD_WORKERS), thread_name_prefix="upload"
+            )
+            _upload_pool_pid = os.getpid()
+        return _upload_pool
+
+
+class ImageUploader:
+    # Uploads start as soon as an image is submitted (notebook images right
+    # after parsing, screenshots as they are captured). finish() waits for
+    # them, shares the new files and returns {(qn, item_index, kind): file_id}.
+    def __init__(
+        self,
+        drive_service,
+        share_images: bool,
+        cache: UploadCache = None,
+        image_settings: dict = None,
+    ):
+        self.drive_service = drive_service
+        self.share_images = share_images
+        self.cache = cache
+        self.image_settings = image_settings
+        self._pool = get_upload_pool()
+        self._futures = {}
+
+    def submit(self, key: tuple, prefix: str, source):
+        self._futures[key] = self._pool.submit(self._upload, prefix, source)
+
+    def submit_items(self, questions: dict, screenshots: bool = True):
+        for qn, q in questions.items():
+            for item_index, item in enumerate(q.get("items", [])):
+                if item.get("image_b64"):
+                    self.submit((qn, item_index, "image"), "lab-evidence", item["image_b64"])
+                if screenshots and item.get("screenshot_png"):
+                    self.submit(
+                        (qn, item_index, "screenshot"),
+                        "lab-evidence-shot",
+                        item["screenshot_png"],
+                    )
 
-            if item.get("image_b64"):
-                add_text(f"Image {i}:\n")
+    def _upload(self, prefix: str, source):
+        digest = None
+        try:
+            raw = base64.b64decode(source) if isinstance(source, str) else source
+            if self.cache is not None:
+                digest = image_digest(raw, self.image_settings)
                 try:
-                    file_id = upload_image(drive_service, item["image_b64"])
-                    if share_images:
-                        maybe_share_file(drive_service, file_id)
-                    image_url = f"https://drive.google.com/uc?id={file_id}"
-                    requests.append(
-                        {
-                            "insertInlineImage": {
-                                "location": {"index": index},
-                                "uri": image_url,
-                                "objectSize": {
-                                    "height": {"magnitude": 300, "unit": "PT"},
-                                    "width": {"magnitude": 450, "unit": "PT"},
-                                },
-                            }
-                        }
-                    )
-                    index += 1
-                    add_text("\n")
+                    entry = self.cache.lookup(digest, self.drive_service)
                 except Exception:
-                    add_text("(Image attached in Drive; embed failed)\n")
-                add_text("\n")
+                    entry = None
+                if entry:
+                    return entry["file_id"], entry.get("shared", False)
+            mimetype = "image/png"
+            if self.image_settings is not None:
+                # Resizing runs in a worker process; this thread only waits on it.
+                raw, mimetype = prepare_image_in_pool(raw, **self.image_settings)
+            file_id = upload_image_bytes(self.drive_service, raw, prefix, mimetype)
+            if digest is not None:
+                self.cache.put(digest, file_id, len(raw))
+            return file_id, False
+        except Exception:
+            return None, False
+
+    def finish(self) -> dict:
+        results = {key: future.result() for key, future in self._futures.items()}
+        uploads = {key: file_id for key, (file_id, _) in results.items()}
+
+        if self.share_images:
+            unshared = list(
+                dict.fromkeys(
+                    file_id for file_id, shared in results.values() if file_id and not shared
+                )
+            )
+            failed = share_files(self.drive_service, unshared)
+            for key, file_id in uploads.items():
+                if file_id in failed:
+                    uploads[key] = None
+            if self.cache is not None:
+                self.cache.mark_shared(set(unshared) - failed)
+        if self.cache is not None and results:
+            self.cache.save()
+        return uploads
+
+    def cancel(self):
+        for future in self._futures.values():
+            future.cancel()
+
+
+def upload_images(
+    questions: dict,
+    drive_service,
+    share_images: bool,
+    cache: UploadCache = None,
+    image_settings: dict = None,
+) -> dict:
+    uploader = ImageUploader(drive_service, share_images, cache, image_settings)
+    uploader.submit_items(questions)
+    return uploader.finish()
+
+
+def _doc_length(txt: str) -> int:
+    # Docs indices count UTF-16 code units, so astral characters count twice.
+    if txt.isascii():
+        return len(txt)
+    return len(txt.encode("utf-16-le")) // 2
+
+
+class _RequestWriter:
+    # Buffers contiguous text and emits one insertText per run, flushing only
+    # at image boundaries. Styles are applied to ranges of the run afterwards.
+    def __init__(self, index: int = 1):
+        self.requests = []
+        self.index = index
+        self.failed = False
+        self._parts = []
+        self._start = index
+        self._styles = []
+
+    def add_text(self, txt: str, style: str = None):
+        if not self._parts:
+            self._start = self.index
+        start = self.index
+        self._parts.append(txt)
+        self.index += _doc_length(txt)
+        if style is None:
+            return
+        if self._styles and self._styles[-1][0] == style and self._styles[-1][2] == start:
+            self._styles[-1][2] = self.index
+        else:
+            self._styles.append([style, start, self.index])
 
-            if item.get("screenshot_file"):
-                add_text(f"Output {i}:\n")
-                try:
-                    file_id = upload_image_file(drive_service, item["screenshot_file"])
-                    if share_images:
-                        maybe_share_file(drive_service, file_id)
-                    image_url = f"https://drive.google.com/uc?id={file_id}"
-                    requests.append(
-                        {
-                            "insertInlineImage": {
-                                "location": {"index": index},
-                                "uri": image_url,
-                                "objectSize": {
-                                    "height": {"magnitude": 300, "unit": "PT"},
-                                    "width": {"magnitude": 450, "unit": "PT"},
-                                },
-                            }
+    def flush(self):
+        if not self._parts:
+            return
+        start, end = self._start, self.index
+        self.requests.append(
+            {"insertText": {"location": {"index": start}, "text": "".join(self._parts)}}
+        )
+        # Inserted text inherits the style around the insertion point, so the
+        # whole run is reset before headings and code are styled.
+        self.requests.append(
+            {
+                "updateParagraphStyle": {
+                    "range": {"startIndex": start, "endIndex": end},
+                    "paragraphStyle": {"namedStyleType": "NORMAL_TEXT"},
+                    "fields": "namedStyleType",
+                }
+            }
+        )
+        self.requests.append(
+            {
+                "updateTextStyle": {
+                    "range": {"startIndex": start, "endIndex": end},
+                    "textStyle": {},
+                    "fields": "weightedFontFamily",
+                }
+            }
+        )
+        for style, style_start, style_end in self._styles:
+            rng = {"startIndex": style_start, "endIndex": style_end}
+            if style == "code":
+                self.requests.append(
+                    {
+                        "updateTextStyle": {
+                            "range": rng,
+                            "textStyle": {"weightedFontFamily": {"fontFamily": CODE_FONT}},
+                            "fields": "weightedFontFamily",
                         }
-                    )
-                    index += 1
-                    add_text("\n")
-                except Exception:
-                    add_text("(Screenshot attached in Drive; embed failed)\n")
-                add_text("\n")
+                    }
+                )
+            else:
+                self.requests.append(
+                    {
+                        "updateParagraphStyle": {
+                            "range": rng,
+                            "paragraphStyle": {"namedStyleType": NAMED_STYLES[style]},
+                            "fields": "namedStyleType",
+                        }
+                    }
+                )
+        self._parts = []
+        self._styles = []
+
+    def finish(self) -> list:
+        self.flush()
+        return self.requests
+
+    def add_image(self, file_id: str):
+        self.flush()
+        image_url = f"https://drive.google.com/uc?id={file_id}"
+        self.requests.append(
+            {
+                "insertInlineImage": {
+                    "location": {"index": self.index},
+                    "uri": image_url,
+                    "objectSize": {
+                        "height": {"magnitude": DISPLAY_HEIGHT_PT, "unit": "PT"},
+                        "width": {"magnitude": DISPLAY_WIDTH_PT, "unit": "PT"},
+                    },
+                }
+            }
+        )
+        self.index += 1
+        self.add_text("\n")
 
-            if item.get("reasoning"):
-                add_text(f"Reasoning {i}:\n")
-                for line in item["reasoning"].strip().splitlines():
-                    add_text(f"    {line}\n")
-                add_text("\n")
 
+def _add_question(writer: _RequestWriter, qn: str, q: dict, uploads: dict):
+    add_text = writer.add_text
+    add_text(f"Question {qn}\n", "heading")
+    add_text("=" * 40 + "\n")
+
+    items = q.get("items", [])
+    for i, item in enumerate(items, start=1):
+        add_text(f"Code {i}:\n")
+        for line in item["code"].strip().splitlines():
+            add_text(f"    {line}\n", "code")
         add_text("\n")
 
-    return requests
+        if item.get("image_b64"):
+            add_text(f"Image {i}:\n")
+            file_id = uploads.get((qn, i - 1, "image"))
+            if file_id:
+                writer.add_image(file_id)
+            else:
+                writer.failed = True
+                add_text("(Image attached in Drive; embed failed)\n")
+            add_text("\n")
+
+        if item.get("screenshot_png"):
+            add_text(f"Output {i}:\n")
+            file_id = uploads.get((qn, i - 1, "screenshot"))
+            if file_id:
+                writer.add_image(file_id)
+            else:
+                writer.failed = True
+                add_text("(Screenshot attached in Drive; embed failed)\n")
+            add_text("\n")
+
+        if item.get("reasoning"):
+            add_text(f"Reasoning {i}:\n")
+            for line in item["reasoning"].strip().splitlines():
+                add_text(f"    {line}\n")
+            add_text("\n")
+
+    add_text("\n")
+
+
+def build_doc_requests(
+    questions: dict,
+    drive_service,
+    share_images: bool,
+    upload_cache: UploadCache = None,
+    layout: list = None,
+    image_settings: dict = None,
+):
+    uploads = upload_images(
+        questions, drive_service, share_images, upload_cache, image_settings
+    )
+    return assemble_doc_requests(questions, uploads, layout)
+
+
+def assemble_doc_requests(questions: dict, uploads: dict, layout: list = None):
+    writer = _RequestWriter()
+    writer.add_text("Lab Evidence\n", "title")
+    writer.add_text("\n")
+
+    for qn in sorted(questions.keys(), key=lambda x: int(x)):
+        start = writer.index
+        writer.failed = False
+        _add_question(writer, qn, questions[qn], uploads)
+        if layout is not None:
+            layout.append((qn, start, writer.index, writer.failed))
+
+    return writer.finish()
+
+
+def _layout_state(layout: list, fingerprints: dict) -> list:
+    # Sections with a failed embed get no fingerprint so the next run retries them.
+    return [
+        {
+            "qn": qn,
+            "start": start,
+            "end": end,
+            "fingerprint": "" if failed else fingerprints[qn],
+        }
+        for qn, start, end, failed in layout
+    ]
+
+
+def update_doc_incrementally(
+    docs_service,
+    drive_service,
+    previous: dict,
+    questions: dict,
+    fingerprints: dict,
+    share_images: bool,
+    upload_cache: UploadCache = None,
+    image_settings: dict = None,
+):
+    doc_id = previous["doc_id"]
+    try:
+        current = execute_with_retry(
+            docs_service.documents().get(documentId=doc_id, fields="revisionId")
+        )
+    except HttpError:
+        return None
+    if current.get("revisionId") != previous.get("revision_id"):
+        # Edited by hand (or by someone else) since our last write.
+        return None
+
+    old = {entry["qn"]: entry for entry in previous["questions"]}
+    dirty = {
+        qn for qn in questions
+        if qn not in old or old[qn]["fingerprint"] != fingerprints[qn]
+    }
+    if not dirty and old.keys() == questions.keys():
+        return dict(previous, changed=[])
+
+    uploads = upload_images(
+        {qn: questions[qn] for qn in dirty},
+        drive_service,
+        share_images,
+        upload_cache,
+        image_settings,
+    )
+
+    # Walk sections from the end of the doc backwards so every edit leaves the
+    # indices of the sections still to be processed untouched.
+    requests = []
+    sections = {}
+    next_start = previous["end"]
+    for qn in sorted(old.keys() | questions.keys(), key=int, reverse=True):
+        entry = old.get(qn)
+        if entry is not None:
+            position = entry["start"]
+            if qn not in questions or qn in dirty:
+                requests.append(
+                    {
+                        "deleteContentRange": {
+                            "range": {"startIndex": entry["start"], "endIndex": entry["end"]}
+                        }
+                    }
+                )
+        else:
+            position = next_start
+        if qn in dirty:
+            writer = _RequestWriter(position)
+            _add_question(writer, qn, questions[qn], uploads)
+            requests.extend(writer.finish())
+            sections[qn] = (writer.index - position, writer.failed)
+        elif qn in questions:
+            sections[qn] = (entry["end"] - entry["start"], False)
+        next_start = position
+
+    try:
+        revision_id = batch_update_doc(
+            docs_service, doc_id, requests, revision_id=previous["revision_id"]
+        )
+    except HttpError as exc:
+        # 400: stale revision or bad indices. 403: the Doc went read-only
+        # when the submission was turned in. 404: deleted or trashed. The
+        # caller builds a fresh Doc in every case.
+        if exc.resp.status in (400, 403, 404):
+            return None
+        raise
+
+    layout = []
+    index = previous["header_end"]
+    for qn in sorted(questions.keys(), key=int):
+        length, failed = sections[qn]
+        layout.append((qn, index, index + length, failed))
+        index += length
+    state = dict(
+        previous,
+        revision_id=revision_id,
+        end=index,
+        questions=_layout_state(layout, fingerprints),
+    )
+    state["changed"] = sorted(dirty | (old.keys() - questions.keys()), key=int)
+    return state
 
 
 def attach_and_turn_in(classroom_service, class_id: str, assignment_id: str, doc_id: str):
-    submissions = classroom_service.courses().courseWork().studentSubmissions().list(
-        courseId=class_id, courseWorkId=assignment_id, userId="me"
-    ).execute()
+    submissions = execute_with_retry(
+        classroom_service.courses().courseWork().studentSubmissions().list(
+            courseId=class_id, courseWorkId=assignment_id, userId="me"
+        )
+    )
     items = submissions.get("studentSubmissions", [])
     if not items:
         raise RuntimeError("No student submission found for this assignment.")
     submission_id = items[0]["id"]
 
-    classroom_service.courses().courseWork().studentSubmissions().modifyAttachments(
-        courseId=class_id,
-        courseWorkId=assignment_id,
-        id=submission_id,
-        body={
-            "addAttachments": [
-                {
-                    "driveFile": {
-                        "id": doc_id,
-                    }
-                }
-            ]
-        },
-    ).execute()
+    try:
+        execute_with_retry(
+            classroom_service.courses().courseWork().studentSubmissions().modifyAttachments(
+                courseId=class_id,
+                courseWorkId=assignment_id,
+                id=submission_id,
+                body={
+                    "addAttachments": [
+                        {
+                            "driveFile": {
+                                "id": doc_id,
+                            }
+                        }
+                    ]
+                },
+            )
+        )
+
+        execute_with_retry(
+            classroom_service.courses().courseWork().studentSubmissions().turnIn(
+                courseId=class_id, courseWorkId=assignment_id, id=submission_id
+            )
+        )
+    finally:
+        # The submission state shown in the assignment list has changed.
+        listing_cache.invalidate("assignments", class_id)
+
 
-    classroom_service.courses().courseWork().studentSubmissions().turnIn(
-        courseId=class_id, courseWorkId=assignment_id, id=submission_id
-    ).execute()
+def _list_all(collection, key: str, **kwargs) -> list:
+    items = []
+    request = collection.list(**kwargs)
+    while request is not None:
+        response = execute_with_retry(request)
+        items.extend(response.get(key, []))
+        request = collection.list_next(request, response)
+    return items
 
 
 def list_pending_assignments(classroom_service, class_id: str):
-    coursework = classroom_service.courses().courseWork().list(
-        courseId=class_id
-    ).execute()
-    items = coursework.get("courseWork", [])
+    course_work = classroom_service.courses().courseWork()
+    items = _list_all(course_work, "courseWork", courseId=class_id)
+
+    # courseWorkId="-" returns the caller's submissions for every coursework
+    # item in one paginated listing instead of one call per assignment.
+    submissions = _list_all(
+        course_work.studentSubmissions(),
+        "studentSubmissions",
+        courseId=class_id,
+        courseWorkId="-",
+        userId="me",
+    )
+    return pending_assignments(items, submissions)
+
+
+def pending_assignments(items: list, submissions: list) -> list:
+    states = {}
+    for sub in submissions:
+        states.setdefault(sub.get("courseWorkId"), sub.get("state"))
 
     pending = []
     for cw in items:
@@ -385,13 +1132,9 @@ def list_pending_assignments(classroom_service, class_id: str):
         if due:
             due_str = f"{due.get('year')}-{due.get('month'):02d}-{due.get('day'):02d}"
 
-        submissions = classroom_service.courses().courseWork().studentSubmissions().list(
-            courseId=class_id, courseWorkId=work_id, userId="me"
-        ).execute()
-        subs = submissions.get("studentSubmissions", [])
-        if not subs:
+        if work_id not in states:
             continue
-        state = subs[0].get("state")
+        state = states[work_id]
         if state in ("NEW", "CREATED", "RECLAIMED_BY_STUDENT"):
             pending.append((work_id, title, due_str, state))
 
@@ -399,13 +1142,128 @@ def list_pending_assignments(classroom_service, class_id: str):
 
 
 def list_drive_folder_files(drive_service, folder_id: str):
-    results = drive_service.files().list(
+    return _list_all(
+        drive_service.files(),
+        "files",
         q=f"'{folder_id}' in parents and trashed=false",
-        fields="files(id, name, mimeType)",
+        fields="nextPageToken, files(id, name, mimeType)",
+        pageSize=1000,
         supportsAllDrives=True,
         includeItemsFromAllDrives=True,
-    ).execute()
-    return results.get("files", [])
+    )
+
+
+def _folder_start_token(drive_service) -> str:
+    response = execute_with_retry(
+        drive_service.changes().getStartPageToken(supportsAllDrives=True)
+    )
+    return response.get("startPageToken")
+
+
+def _folder_unchanged(drive_service, folder_id: str, files: list, token: str):
+    # Drive v3 listings carry no ETag, so revalidate through the changes feed:
+    # if nothing since `token` touched the folder or a listed file, the cached
+    # listing still holds. Returns the token to revalidate from next time.
+    listed = {f["id"] for f in files}
+    page_token = token
+    for _ in range(MAX_CHANGE_PAGES):
+        response = execute_with_retry(
+            drive_service.changes().list(
+                pageToken=page_token,
+                pageSize=1000,
+                spaces="drive",
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+                fields="nextPageToken, newStartPageToken, changes(fileId, file(parents))",
+            )
+        )
+        for change in response.get("changes", []):
+            parents = (change.get("file") or {}).get("parents", [])
+            if change.get("fileId") in listed or folder_id in parents:
+                return None
+        if response.get("newStartPageToken"):
+            return response["newStartPageToken"]
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return None
+    return None
+
+
+def _user_key(creds: Credentials) -> str:
+    # Per-user state (run state, upload cache scope, listings) is keyed on the
+    # Drive account, not the token: every web login issues a new refresh
+    # token. The lookup is one call per login, cached under the token key.
+    key = _credential_key(creds)
+    with _account_ids_lock:
+        account = _account_ids.get(key)
+        if account is not None:
+            _account_ids.move_to_end(key)
+            return account
+    drive_service = get_services(creds)[0]
+    about = execute_with_retry(drive_service.about().get(fields="user/permissionId"))
+    account = hashlib.sha256(
+        f"account:{about['user']['permissionId']}".encode("utf-8")
+    ).hexdigest()
+    with _account_ids_lock:
+        _account_ids[key] = account
+        while len(_account_ids) > MAX_CACHED_SERVICES:
+            _account_ids.popitem(last=False)
+    return account
+
+
+def cached_drive_folder_files(creds: Credentials, drive_service, folder_id: str):
+    def load():
+        try:
+            token = _folder_start_token(drive_service)
+        except HttpError:
+            token = None
+        return list_drive_folder_files(drive_service, folder_id), token
+
+    return listing_cache.get(
+        ("folder", folder_id, _user_key(creds)),
+        load,
+        revalidate=lambda files, token: _folder_unchanged(
+            drive_service, folder_id, files, token
+        ),
+    )
+
+
+def cached_pending_assignments(creds: Credentials, classroom_service, class_id: str):
+    # Classroom exposes no ETags or change feed; the TTL and the invalidation
+    # in attach_and_turn_in keep this fresh.
+    return listing_cache.get(
+        ("assignments", class_id, _user_key(creds)),
+        lambda: (list_pending_assignments(classroom_service, class_id), None),
+    )
+
+
+def list_folder_notebooks(drive_service, folder_id: str):
+    return [
+        f
+        for f in list_drive_folder_files(drive_service, folder_id)
+        if f["name"].lower().endswith(".ipynb") or f["mimeType"] == COLAB_MIME_TYPE
+    ]
+
+
+def _upload_cache(config: dict, creds: Credentials, session_id: str = None):
+    if not config.get("upload_cache", True):
+        return None
+    if session_id:
+        return get_upload_cache().scoped(_user_key(creds))
+    return get_upload_cache()
+
+
+def image_settings(config: dict):
+    if not config.get("optimize_images", True):
+        return None
+    fmt = config.get("image_format", "png")
+    if fmt not in MIME_TYPES:
+        raise ValueError(f"image_format must be one of {', '.join(MIME_TYPES)}.")
+    return {
+        "fmt": fmt,
+        "quality": int(config.get("image_quality", DEFAULT_QUALITY)),
+        "scale": float(config.get("image_scale", DEFAULT_SCALE)),
+    }
 
 
 def run_pipeline(
@@ -413,63 +1271,350 @@ def run_pipeline(
     *,
     auto_number: bool,
     turn_in: bool,
+    progress=None,
+    session_id: str = None,
 ):
-    creds = get_credentials()
-    drive_service, docs_service, classroom_service = get_services(creds)
+    timer = RunTimer(notebook_file_id=config.get("notebook_file_id"))
+
+    def report(stage: str):
+        timer.stage(stage)
+        if progress is not None:
+            progress(stage)
+
+    try:
+        doc_id = _run_pipeline(config, auto_number, turn_in, report, session_id)
+    except Exception as exc:
+        timer.finish("error", error=type(exc).__name__)
+        raise
+    timer.finish("ok", doc_id=doc_id)
+    return doc_id
+
+
+def _attach_screenshot(questions: dict, screenshot_map: list, index: int, png: bytes):
+    qn, item_index, _ = screenshot_map[index]
+    items = questions[qn].setdefault("items", [])
+    while len(items) <= item_index:
+        items.append({"code": "", "outputs": ""})
+    items[item_index]["screenshot_png"] = png
+    return qn, item_index
+
+
+def _capture_screenshots(config: dict, nb, screenshot_map: list, on_screenshot=None) -> list:
+    if config.get("screenshot_renderer", "lite") == "nbconvert":
+        page_html, wait_until = export_notebook_html(nb), "networkidle"
+    else:
+        page_html, wait_until = render_outputs_html(nb, screenshot_map), "load"
+    shots = capture_output_screenshots(
+        page_html,
+        wait_until=wait_until,
+        crop=config.get("screenshot_capture", "elements") == "crop",
+        on_screenshot=on_screenshot,
+    )
+    print(f"Screenshot capture: found {len(shots)} output images")
+    return shots
+
+
+def _discard_doc(drive_service, doc_id: str):
+    try:
+        execute_with_retry(drive_service.files().delete(fileId=doc_id, supportsAllDrives=True))
+    except Exception:
+        pass
+
+
+def _write_new_doc(
+    config: dict,
+    questions: dict,
+    screenshot_map: list,
+    services: tuple,
+    upload_kwargs: dict,
+    capture,
+    report,
+):
+    # Stages overlap: the Doc is created while screenshots are captured,
+    # notebook images upload from the start and every screenshot is handed to
+    # the uploader as soon as it is taken. The requests are assembled once all
+    # uploads have resolved.
+    drive_service, docs_service, _ = services
+    report("upload_images" if capture is None else "screenshots")
+    uploader = ImageUploader(
+        drive_service,
+        config.get("share_images", False),
+        upload_kwargs["upload_cache"],
+        upload_kwargs["image_settings"],
+    )
+    creator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="create-doc")
+    doc_future = creator.submit(create_doc, docs_service, config.get("doc_title", "Lab Evidence"))
+    creator.shutdown(wait=False)
+    try:
+        uploader.submit_items(questions, screenshots=capture is None)
+        if capture is not None:
+
+            def on_screenshot(index: int, png: bytes):
+                if index < len(screenshot_map):
+                    qn, item_index = _attach_screenshot(questions, screenshot_map, index, png)
+                    uploader.submit((qn, item_index, "screenshot"), "lab-evidence-shot", png)
+
+            capture(on_screenshot)
+            report("upload_images")
+
+        uploads = uploader.finish()
+        layout = []
+        requests = assemble_doc_requests(questions, uploads, layout)
+        report("write_doc")
+        doc_id, revision_id = doc_future.result()
+    except BaseException:
+        uploader.cancel()
+        # Do not leave an empty Doc behind for a run that failed.
+        doc_future.add_done_callback(
+            lambda future: future.exception() is None
+            and _discard_doc(drive_service, future.result()[0])
+        )
+        raise
+    revision_id = batch_update_doc(docs_service, doc_id, requests, revision_id)
+    return doc_id, revision_id, layout
+
 
-    nb = download_notebook(drive_service, config["notebook_file_id"])
-    questions, screenshot_map = parse_notebook(nb, auto_number)
+def _run_pipeline(
+    config: dict, auto_number: bool, turn_in: bool, report, session_id: str = None
+) -> str:
+    report("auth")
+    creds = get_credentials(session_id)
+    services = get_services(creds)
+    drive_service, docs_service, classroom_service = services
+
+    file_id = config["notebook_file_id"]
+    shots_tag = None
+    if config.get("screenshot_outputs", False):
+        shots_tag = "{}:{}".format(
+            config.get("screenshot_renderer", "lite"),
+            config.get("screenshot_capture", "elements"),
+        )
+    cache = get_notebook_cache() if config.get("notebook_cache", True) else None
+
+    report("download")
+    revision = notebook_revision(drive_service, file_id) if cache is not None else None
+    cached = cache.get(file_id, revision, auto_number, shots_tag) if revision else None
+    if cached is not None and (shots_tag is None or cached[2] is not None):
+        questions, screenshot_map, cached_shots = cached
+        nb = None
+        print("Notebook unchanged since the last run; using the cached parse.")
+    else:
+        nb = download_notebook(
+            drive_service,
+            file_id,
+            chunk_size=int(config.get("download_chunk_mb", 16)) * 1024 * 1024,
+            max_bytes=int(config.get("max_notebook_mb", 256)) * 1024 * 1024,
+        )
+        report("parse")
+        questions, screenshot_map = parse_notebook(nb, auto_number)
+        cached_shots = None
     if not questions:
         raise RuntimeError(
             "No questions found. Add markdown cells with Q1 / Question 1, etc."
         )
 
-    shots = []
-    if config.get("screenshot_outputs", False):
-        html_path = export_notebook_html(nb)
-        shots = capture_output_screenshots(html_path)
-        os.unlink(html_path)
-        print(f"Screenshot capture: found {len(shots)} output images")
-        for i, (qn, item_index) in enumerate(screenshot_map):
-            if i < len(shots):
-                items = questions[qn].setdefault("items", [])
-                while len(items) <= item_index:
-                    items.append({"code": "", "outputs": ""})
-                items[item_index]["screenshot_file"] = shots[i]
-
-    title = config.get("doc_title", "Lab Evidence")
-    doc_id = create_doc(docs_service, title)
-    requests = build_doc_requests(
-        questions, drive_service, config.get("share_images", False)
-    )
-    docs_service.documents().batchUpdate(
-        documentId=doc_id, body={"requests": requests}
-    ).execute()
-
-    for path in shots:
+    def save_to_cache(shots=None):
         try:
-            os.unlink(path)
-        except OSError:
-            pass
+            cache.put(
+                file_id, revision, auto_number, questions, screenshot_map, shots, shots_tag
+            )
+        except OSError as exc:
+            print(f"Could not cache the parsed notebook: {exc}")
+
+    if revision and cached is None and shots_tag is None:
+        save_to_cache()
+
+    capture = None
+    if shots_tag is not None:
+
+        def capture(on_screenshot=None):
+            if cached_shots is not None:
+                if on_screenshot is not None:
+                    for i, png in enumerate(cached_shots):
+                        on_screenshot(i, png)
+                return cached_shots
+            shots = _capture_screenshots(config, nb, screenshot_map, on_screenshot)
+            if revision:
+                save_to_cache(shots)
+            return shots
+
+    upload_kwargs = {
+        "upload_cache": _upload_cache(config, creds, session_id),
+        "image_settings": image_settings(config),
+    }
+    settings = settings_fingerprint(config)
+    key = run_key(config, _user_key(creds))
+
+    state = None
+    previous = run_states.get(key) if config.get("incremental", False) else None
+    if previous and previous.get("settings") == settings:
+        # Fingerprints cover screenshots, so capture has to finish before the
+        # changed questions are known.
+        if capture is not None:
+            report("screenshots")
+            shots = capture()
+            for i, png in enumerate(shots[: len(screenshot_map)]):
+                _attach_screenshot(questions, screenshot_map, i, png)
+            capture = None
+        report("update_doc")
+        state = update_doc_incrementally(
+            docs_service,
+            drive_service,
+            previous,
+            questions,
+            {qn: question_fingerprint(qn, q) for qn, q in questions.items()},
+            config.get("share_images", False),
+            **upload_kwargs,
+        )
+        if state is None:
+            print("Previous doc changed or is gone; rebuilding from scratch.")
+        else:
+            print(f"Incremental update: {len(state['changed'])} question(s) rewritten")
 
-    if turn_in:
-        attach_and_turn_in(
-            classroom_service, config["class_id"], config["assignment_id"], doc_id
+    if state is None:
+        doc_id, revision_id, layout = _write_new_doc(
+            config, questions, screenshot_map, services, upload_kwargs, capture, report
         )
+        fingerprints = {qn: question_fingerprint(qn, q) for qn, q in questions.items()}
+        state = {
+            "doc_id": doc_id,
+            "revision_id": revision_id,
+            "settings": settings,
+            "header_end": layout[0][1] if layout else 1,
+            "end": layout[-1][2] if layout else 1,
+            "questions": _layout_state(layout, fingerprints),
+            "turned_in": False,
+        }
+    state.pop("changed", None)
+    doc_id = state["doc_id"]
+
+    if turn_in:
+        if state.get("turned_in"):
+            print("Doc was already attached and turned in; skipping turn-in.")
+        else:
+            report("turn_in")
+            attach_and_turn_in(
+                classroom_service, config["class_id"], config["assignment_id"], doc_id
+            )
+            state["turned_in"] = True
+
+    if config.get("incremental", False):
+        run_states.put(key, state)
 
     return doc_id
 
 
+def run_bulk(
+    config: dict,
+    folder_id: str,
+    *,
+    auto_number: bool,
+    workers: int = BULK_WORKERS,
+    progress=None,
+    session_id: str = None,
+):
+    # The browser pool, service clients and upload cache are process-wide, so
+    # every worker below shares them.
+    creds = get_credentials(session_id)
+    drive_service, _, _ = get_services(creds)
+    notebooks = list_folder_notebooks(drive_service, folder_id)
+    title = config.get("doc_title", "Lab Evidence")
+    total = len(notebooks)
+    finished = 0
+    lock = threading.Lock()
+
+    def run_one(notebook: dict) -> dict:
+        nonlocal finished
+        name = notebook["name"]
+        if name.lower().endswith(".ipynb"):
+            name = name[: -len(".ipynb")]
+        nb_config = dict(
+            config, notebook_file_id=notebook["id"], doc_title=f"{title} - {name}"
+        )
+        result = {"file_id": notebook["id"], "name": notebook["name"]}
+        start = time.perf_counter()
+        try:
+            result["doc_id"] = run_pipeline(
+                nb_config, auto_number=auto_number, turn_in=False, session_id=session_id
+            )
+        except Exception as exc:
+            result["error"] = str(exc)
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        with lock:
+            finished += 1
+            if progress is not None:
+                progress(f"notebooks {finished}/{total}")
+        return result
+
+    start = time.perf_counter()
+    results = []
+    if notebooks:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, total))) as pool:
+            results = list(pool.map(run_one, notebooks))
+    return {
+        "folder_id": folder_id,
+        "notebooks": total,
+        "succeeded": sum(1 for r in results if "doc_id" in r),
+        "failed": sum(1 for r in results if "error" in r),
+        "seconds": round(time.perf_counter() - start, 3),
+        "results": results,
+    }
+
+
+def warm_up(browser: bool = True):
+    # Pays the one-off costs a first run would otherwise hit: parsing the
+    # discovery documents, importing the API client and nbconvert, and
+    # launching Chromium. Safe to call again; everything is cached.
+    import google_auth_httplib2  # noqa: F401
+    import googleapiclient.discovery  # noqa: F401
+    import googleapiclient.http  # noqa: F401
+    import nbformat  # noqa: F401
+    from PIL import Image  # noqa: F401
+
+    for name, version in SERVICE_VERSIONS:
+        _discovery_doc(name, version)
+    # The first render imports the Markdown, highlighting and sanitising
+    # libraries nbconvert loads lazily, which costs more than the import.
+    export_notebook_html(
+        {
+            "nbformat": 4,
+            "nbformat_minor": 5,
+            "metadata": {},
+            "cells": [
+                {
+                    "id": "warm-up",
+                    "cell_type": "code",
+                    "source": "",
+                    "metadata": {},
+                    "outputs": [],
+                    "execution_count": None,
+                }
+            ],
+        }
+    )
+    if browser:
+        try:
+            get_browser_pool().warm()
+        except Exception as exc:
+            print(f"Browser warm-up failed: {exc}")
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", required=True)
     parser.add_argument("--list-assignments", action="store_true")
     parser.add_argument("--list-drive-folder", default=None)
+    parser.add_argument("--bulk-folder", default=None)
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS)
+    parser.add_argument("--report", default="bulk_report.json")
     parser.add_argument("--auto-number", action="store_true")
     parser.add_argument("--no-turn-in", action="store_true")
+    parser.add_argument("--incremental", action="store_true")
     args = parser.parse_args()
 
     config = load_config(args.config)
+    if args.incremental:
+        config["incremental"] = True
     creds = get_credentials()
     drive_service, docs_service, classroom_service = get_services(creds)
 
@@ -495,6 +1640,26 @@ def main():
         return
 
     auto_number = args.auto_number or config.get("auto_number", False)
+
+    if args.bulk_folder:
+        summary = run_bulk(
+            config,
+            args.bulk_folder,
+            auto_number=auto_number,
+            workers=args.workers,
+            progress=print,
+        )
+        for r in summary["results"]:
+            outcome = f"doc={r['doc_id']}" if "doc_id" in r else f"FAILED: {r['error']}"
+            print(f"- {r['name']} | {r['seconds']:.1f}s | {outcome}")
+        print(
+            f"{summary['succeeded']} of {summary['notebooks']} notebooks done "
+            f"in {summary['seconds']:.1f}s."
+        )
+        write_atomic(args.report, json.dumps(summary, indent=2))
+        print(f"Report written to {args.report}")
+        return
+
     doc_id = run_pipeline(
         config,
         auto_number=auto_number,
@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+DEFAULT_TTL = float(os.getenv("LISTING_CACHE_TTL", "60"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("LISTING_CACHE_MAX_ENTRIES", "1000"))
+
+
+class ListingCache:
+    # Keys are tuples, (kind, scope_id, user); invalidate() drops every entry
+    # whose key starts with the given prefix.
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, load, revalidate=None):
+        # load() -> (value, validator). Once the TTL has passed, an entry with
+        # a validator is offered to revalidate(value, validator), which returns
+        # a fresh validator if the value still holds or None to reload.
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry["expires"] > now:
+                    return entry["value"]
+
+        if entry is not None and revalidate is not None and entry["validator"] is not None:
+            try:
+                validator = revalidate(entry["value"], entry["validator"])
+            except Exception:
+                validator = None
+            if validator is not None:
+                self._store(key, entry["value"], validator)
+                return entry["value"]
+
+        value, validator = load()
+        self._store(key, value, validator)
+        return value
+
+    def _store(self, key: tuple, value, validator):
+        with self._lock:
+            self._entries[key] = {
+                "value": value,
+                "validator": validator,
+                "expires": time.monotonic() + self.ttl,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k[: len(prefix)] == prefix]:
+                del self._entries[key]
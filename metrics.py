@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, count, total) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(key, (("le", repr(float(bound))),))
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _format_labels(key, (("le", "+Inf"),))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "lab_agent_stage_seconds", "Time spent in each run_pipeline stage."
+)
+RUN_SECONDS = Histogram("lab_agent_run_seconds", "End-to-end run_pipeline time.")
+RUNS = Counter("lab_agent_runs_total", "Pipeline runs by outcome.")
+API_SECONDS = Histogram(
+    "lab_agent_api_call_seconds", "Latency of Google API calls, including retries."
+)
+API_CALLS = Counter("lab_agent_api_calls_total", "Google API calls by method and outcome.")
+BYTES_DOWNLOADED = Counter(
+    "lab_agent_downloaded_bytes_total", "Notebook bytes downloaded from Drive."
+)
+BYTES_UPLOADED = Counter("lab_agent_uploaded_bytes_total", "Image bytes uploaded to Drive.")
+
+REGISTRY = [
+    RUNS,
+    RUN_SECONDS,
+    STAGE_SECONDS,
+    API_CALLS,
+    API_SECONDS,
+    BYTES_DOWNLOADED,
+    BYTES_UPLOADED,
+]
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class RunTimer:
+    # Stages are contiguous: starting one closes the previous, so the stage
+    # durations add up to the run's wall time.
+    def __init__(self, **fields):
+        self.fields = fields
+        self.stages = []
+        self._start = time.perf_counter()
+        self._stage = None
+        self._stage_start = None
+
+    def stage(self, name: str):
+        now = time.perf_counter()
+        self._close(now)
+        self._stage = name
+        self._stage_start = now
+
+    def _close(self, now: float):
+        if self._stage is None:
+            return
+        elapsed = now - self._stage_start
+        STAGE_SECONDS.observe(elapsed, stage=self._stage)
+        self.stages.append({"stage": self._stage, "seconds": round(elapsed, 4)})
+        self._stage = None
+
+    def finish(self, status: str, **fields) -> dict:
+        now = time.perf_counter()
+        self._close(now)
+        total = now - self._start
+        RUN_SECONDS.observe(total)
+        RUNS.inc(status=status)
+        record = dict(self.fields, **fields)
+        record.update(
+            {
+                "event": "run_timing",
+                "status": status,
+                "seconds": round(total, 4),
+                "stages": self.stages,
+            }
+        )
+        print(json.dumps(record), flush=True)
+        return record
+
+
+def observe_api_call(method: str, seconds: float, outcome: str):
+    API_SECONDS.observe(seconds, method=method)
+    API_CALLS.inc(method=method, outcome=outcome)
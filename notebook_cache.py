@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zipfile
+
+from googleapiclient.errors import HttpError
+
+from retry import execute_with_retry
+
+
+DEFAULT_CACHE_DIR = os.getenv("NOTEBOOK_CACHE_DIR", ".notebook_cache")
+DEFAULT_MAX_BYTES = int(os.getenv("NOTEBOOK_CACHE_MAX_MB", "512")) * 1024 * 1024
+FORMAT_VERSION = 1
+
+
+def notebook_revision(drive_service, file_id: str):
+    # One small metadata call; None means the file cannot be versioned and
+    # should not be cached.
+    try:
+        meta = execute_with_retry(
+            drive_service.files().get(
+                fileId=file_id,
+                fields="headRevisionId, md5Checksum, modifiedTime",
+                supportsAllDrives=True,
+            )
+        )
+    except HttpError:
+        return None
+    return meta.get("headRevisionId") or meta.get("md5Checksum") or meta.get("modifiedTime")
+
+
+class NotebookCache:
+    # One zip per (file, auto_number): meta.json holds the parsed questions and
+    # screenshot map (deflated), shots/N.png the captured screenshots (stored
+    # as is, PNG is already compressed). An entry is only used while its
+    # Drive revision matches; the least recently used files are evicted once
+    # the directory grows past max_bytes.
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, file_id: str, auto_number: bool) -> str:
+        name = hashlib.sha256(f"{file_id}:{bool(auto_number)}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.zip")
+
+    def get(self, file_id: str, revision: str, auto_number: bool, shots_tag: str = None):
+        # Returns (questions, screenshot_map, shots); shots is None unless
+        # screenshots taken with the same capture settings were stored.
+        path = self._path(file_id, auto_number)
+        try:
+            with zipfile.ZipFile(path) as archive:
+                meta = json.loads(archive.read("meta.json"))
+                if meta.get("version") != FORMAT_VERSION or meta.get("revision") != revision:
+                    return None
+                shots = None
+                if shots_tag is not None and meta.get("shots_tag") == shots_tag:
+                    shots = [archive.read(f"shots/{i}.png") for i in range(meta["shots"])]
+            os.utime(path)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+        screenshot_map = [tuple(entry) for entry in meta["screenshot_map"]]
+        return meta["questions"], screenshot_map, shots
+
+    def put(
+        self,
+        file_id: str,
+        revision: str,
+        auto_number: bool,
+        questions: dict,
+        screenshot_map: list,
+        shots: list = None,
+        shots_tag: str = None,
+    ):
+        stripped = {
+            qn: dict(
+                q,
+                items=[
+                    {k: v for k, v in item.items() if k != "screenshot_png"}
+                    for item in q.get("items", [])
+                ],
+            )
+            for qn, q in questions.items()
+        }
+        meta = {
+            "version": FORMAT_VERSION,
+            "file_id": file_id,
+            "revision": revision,
+            "questions": stripped,
+            "screenshot_map": screenshot_map,
+            "shots_tag": shots_tag if shots is not None else None,
+            "shots": len(shots) if shots is not None else 0,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w") as archive:
+                archive.writestr(
+                    "meta.json", json.dumps(meta), compress_type=zipfile.ZIP_DEFLATED
+                )
+                for i, png in enumerate(shots or []):
+                    archive.writestr(f"shots/{i}.png", png, compress_type=zipfile.ZIP_STORED)
+            os.replace(tmp_path, self._path(file_id, auto_number))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".zip"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_notebook_cache() -> NotebookCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = NotebookCache()
+    return _cache
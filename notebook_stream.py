@@ -0,0 +1,137 @@
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_SEPARATOR = re.compile(r"[ \t\n\r,]*")
+
+
+class NotebookStreamParser:
+    # Incremental .ipynb decoder. Bytes are decoded as they arrive and each
+    # cell is parsed as soon as it is complete, so only the cell currently
+    # being received is ever buffered as raw text.
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes
+        self.bytes_seen = 0
+        self.notebook = {}
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buf = ""
+        # Read offset into _buf. Values are decoded in place and the consumed
+        # prefix is dropped once per _parse call, not once per value.
+        self._pos = 0
+        self._pending = []
+        self._pending_len = 0
+        self._need = 1
+        self._state = "start"
+        self._key = None
+        self._closed = False
+
+    # File-like sink so MediaIoBaseDownload can write straight into the parser.
+    def write(self, data: bytes) -> int:
+        self.bytes_seen += len(data)
+        if self.max_bytes is not None and self.bytes_seen > self.max_bytes:
+            raise RuntimeError(
+                f"Notebook is larger than the {self.max_bytes // (1024 * 1024)} MB limit."
+            )
+        self.feed(self._decoder.decode(data))
+        return len(data)
+
+    def feed(self, text: str):
+        if not text:
+            return
+        self._pending.append(text)
+        self._pending_len += len(text)
+        if len(self._buf) - self._pos + self._pending_len >= self._need:
+            self._parse()
+
+    def close(self) -> dict:
+        tail = self._decoder.decode(b"", final=True)
+        if tail:
+            self._pending.append(tail)
+        self._closed = True
+        self._parse()
+        if self._state != "end":
+            raise ValueError("Notebook JSON ended unexpectedly.")
+        return self.notebook
+
+    def _skip(self, pattern) -> bool:
+        self._pos = pattern.match(self._buf, self._pos).end()
+        return self._pos < len(self._buf)
+
+    def _decode(self):
+        try:
+            value, end = self._json.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if self._closed:
+                raise
+            return None, False
+        # A bare number or literal may continue in the next chunk.
+        if end == len(self._buf) and not self._closed:
+            return None, False
+        self._pos = end
+        return value, True
+
+    def _expect(self, char: str):
+        found = self._buf[self._pos]
+        if found != char:
+            raise ValueError(f"Unexpected {found!r} in notebook JSON.")
+        self._pos += 1
+
+    def _parse(self):
+        if self._pos or self._pending:
+            self._buf = self._buf[self._pos:] + "".join(self._pending)
+            self._pos = 0
+            self._pending = []
+            self._pending_len = 0
+        while True:
+            state = self._state
+            if state == "end":
+                if self._skip(_WHITESPACE):
+                    raise ValueError("Trailing data after notebook JSON.")
+                return
+            if not self._skip(_SEPARATOR if state in ("key", "cell") else _WHITESPACE):
+                self._need = 1
+                return
+
+            if state == "start":
+                self._expect("{")
+                self._state = "key"
+            elif state == "key":
+                if self._buf[self._pos] == "}":
+                    self._pos += 1
+                    self._state = "end"
+                    continue
+                key, ok = self._decode()
+                if not ok:
+                    break
+                self._key = key
+                self._state = "colon"
+            elif state == "colon":
+                self._expect(":")
+                if self._key == "cells":
+                    self._state = "cells"
+                else:
+                    self._state = "value"
+            elif state == "value":
+                value, ok = self._decode()
+                if not ok:
+                    break
+                self.notebook[self._key] = value
+                self._state = "key"
+            elif state == "cells":
+                self._expect("[")
+                self.notebook["cells"] = []
+                self._state = "cell"
+            elif state == "cell":
+                if self._buf[self._pos] == "]":
+                    self._pos += 1
+                    self._state = "key"
+                    continue
+                cell, ok = self._decode()
+                if not ok:
+                    break
+                self.notebook["cells"].append(cell)
+        # Incomplete value: wait until the buffer has doubled before retrying so
+        # a huge cell is re-scanned a logarithmic number of times.
+        self._need = max((len(self._buf) - self._pos) * 2, 1)
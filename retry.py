@@ -0,0 +1,69 @@
+import json
+import os
+import random
+import socket
+import time
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from metrics import observe_api_call
+
+
+MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "5"))
+BASE_DELAY = 1.0
+MAX_DELAY = 32.0
+
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded"}
+
+
+def _error_reasons(exc: HttpError) -> set:
+    try:
+        error = json.loads(exc.content.decode("utf-8")).get("error", {})
+    except (ValueError, AttributeError):
+        return set()
+    reasons = {e.get("reason") for e in error.get("errors", [])}
+    if error.get("status"):
+        reasons.add(error["status"])
+    return reasons
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, HttpError):
+        status = exc.resp.status
+        if status in RETRYABLE_STATUSES:
+            return True
+        # Drive reports per-user rate limits as 403s.
+        return status == 403 and bool(_error_reasons(exc) & RATE_LIMIT_REASONS)
+    return isinstance(exc, (socket.timeout, ConnectionError, httplib2.HttpLib2Error))
+
+
+def backoff_delay(attempt: int) -> float:
+    # Full jitter: spread retries from concurrent workers across the window.
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * (2 ** attempt)))
+
+
+def _method_name(request) -> str:
+    # HttpRequest carries e.g. "drive.files.create"; batches do not.
+    return getattr(request, "methodId", None) or type(request).__name__
+
+
+def execute_with_retry(request, retries: int = MAX_RETRIES, sleep=time.sleep):
+    attempt = 0
+    started = time.perf_counter()
+    while True:
+        try:
+            result = request.execute()
+        except Exception as exc:
+            if attempt >= retries or not is_retryable(exc):
+                status = exc.resp.status if isinstance(exc, HttpError) else "error"
+                observe_api_call(
+                    _method_name(request), time.perf_counter() - started, str(status)
+                )
+                raise
+            sleep(backoff_delay(attempt))
+            attempt += 1
+        else:
+            observe_api_call(_method_name(request), time.perf_counter() - started, "ok")
+            return result
@@ -0,0 +1,66 @@
+import hashlib
+import json
+import os
+import threading
+
+from storage import read_json, write_atomic
+
+
+DEFAULT_STATE_PATH = os.getenv("RUN_STATE_PATH", ".run_state.json")
+
+
+def question_fingerprint(qn: str, q: dict) -> str:
+    digest = hashlib.sha256(qn.encode("utf-8"))
+    for item in q.get("items", []):
+        for key in ("code", "outputs", "reasoning", "image_b64"):
+            value = item.get(key) or ""
+            digest.update(b"\0" + key.encode("ascii") + b"\0")
+            digest.update(value.encode("utf-8"))
+        shot = item.get("screenshot_png")
+        digest.update(b"\0screenshot\0")
+        if shot:
+            digest.update(hashlib.sha256(shot).digest())
+    return digest.hexdigest()
+
+
+def settings_fingerprint(config: dict) -> str:
+    # Anything that changes how every question is rendered forces a full rebuild.
+    keys = (
+        "doc_title",
+        "share_images",
+        "screenshot_outputs",
+        "auto_number",
+        "optimize_images",
+        "image_format",
+        "image_quality",
+        "image_scale",
+    )
+    payload = json.dumps({key: config.get(key) for key in keys}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def run_key(config: dict, user: str) -> str:
+    # Per user: a shared notebook run by two students maps to two Docs.
+    return f"{user}:{config.get('notebook_file_id')}:{config.get('assignment_id')}"
+
+
+class RunStateStore:
+    def __init__(self, path: str = DEFAULT_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            return read_json(self.path, {}).get(key)
+
+    def put(self, key: str, state: dict):
+        with self._lock:
+            data = read_json(self.path, {})
+            data[key] = state
+            write_atomic(self.path, json.dumps(data))
+
+    def discard(self, key: str):
+        with self._lock:
+            data = read_json(self.path, {})
+            if data.pop(key, None) is not None:
+                write_atomic(self.path, json.dumps(data))
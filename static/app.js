@@ -13,10 +13,12 @@ const autoNumberInput = document.getElementById("autoNumber");
 const screenshotsInput = document.getElementById("screenshots");
 const shareImagesInput = document.getElementById("shareImages");
 const turnInInput = document.getElementById("turnIn");
+const incrementalInput = document.getElementById("incremental");
 
 const listAssignmentsBtn = document.getElementById("listAssignments");
 const listNotebooksBtn = document.getElementById("listNotebooks");
 const runBtn = document.getElementById("run");
+const runFolderBtn = document.getElementById("runFolder");
 const loginBtn = document.getElementById("loginBtn");
 const authStatus = document.getElementById("authStatus");
 const logoutBtn = document.getElementById("logoutBtn");
@@ -33,6 +35,41 @@ const setPreview = (docId) => {
   previewEl.innerHTML = `Preview Doc: <a href="${url}" target="_blank" rel="noreferrer">${url}</a>`;
 };
 
+const STAGE_LABELS = {
+  auth: "Signing in",
+  download: "Downloading notebook",
+  parse: "Parsing notebook",
+  screenshots: "Capturing output screenshots",
+  update_doc: "Updating changed questions",
+  upload_images: "Uploading images",
+  write_doc: "Writing doc",
+  turn_in: "Turning in to Classroom",
+};
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+const pollJob = async (jobId) => {
+  while (true) {
+    const res = await fetch(`/api/jobs/${jobId}`);
+    const job = await res.json();
+    if (!res.ok) {
+      throw new Error(job.error || "Lost track of the run.");
+    }
+    if (job.status === "done") return job;
+    if (job.status === "error") {
+      throw new Error(job.error || "Run failed.");
+    }
+    if (job.status === "queued") {
+      setStatus("Queued. Waiting for a free worker...");
+    } else {
+      const step = job.stages.length;
+      const label = STAGE_LABELS[job.stage] || job.stage || "Starting";
+      setStatus(`Running (step ${step}): ${label}...`);
+    }
+    await sleep(1000);
+  }
+};
+
 const renderList = (el, items, onPick) => {
   el.innerHTML = "";
   if (!items.length) {
@@ -59,6 +96,7 @@ const loadConfig = async () => {
   autoNumberInput.checked = cfg.auto_number ?? true;
   screenshotsInput.checked = cfg.screenshot_outputs ?? true;
   shareImagesInput.checked = cfg.share_images ?? true;
+  incrementalInput.checked = cfg.incremental ?? false;
   const authRes = await fetch("/api/auth-status");
   if (authRes.ok) {
     const auth = await authRes.json();
@@ -141,12 +179,13 @@ runBtn.addEventListener("click", async () => {
     screenshot_outputs: screenshotsInput.checked,
     share_images: shareImagesInput.checked,
     turn_in: turnInInput.checked,
+    incremental: incrementalInput.checked,
   };
   if (!payload.class_id || !payload.assignment_id || !payload.notebook_file_id) {
     setStatus("Class ID/URL, Assignment ID/URL, and Notebook ID/URL are required.");
     return;
   }
-  setStatus("Running pipeline. This can take a minute...");
+  setStatus("Submitting run...");
   const res = await fetch("/api/run", {
     method: "POST",
     headers: { "Content-Type": "application/json" },
@@ -157,9 +196,61 @@ runBtn.addEventListener("click", async () => {
     setStatus(err.error || "Run failed.");
     return;
   }
-  const data = await res.json();
-  setStatus(`Done. Doc ID: ${data.doc_id}`);
-  setPreview(data.doc_id);
+  const { job_id: jobId } = await res.json();
+  runBtn.disabled = true;
+  try {
+    const job = await pollJob(jobId);
+    setStatus(`Done. Doc ID: ${job.doc_id}`);
+    setPreview(job.doc_id);
+  } catch (err) {
+    setStatus(err.message);
+  } finally {
+    runBtn.disabled = false;
+  }
+});
+
+runFolderBtn.addEventListener("click", async () => {
+  if (!folderIdInput.value) {
+    setStatus("Folder ID/URL is required.");
+    return;
+  }
+  const payload = {
+    folder_id: folderIdInput.value.trim(),
+    doc_title: docTitleInput.value.trim() || "Lab Evidence",
+    auto_number: autoNumberInput.checked,
+    screenshot_outputs: screenshotsInput.checked,
+    share_images: shareImagesInput.checked,
+  };
+  setStatus("Submitting folder run...");
+  const res = await fetch("/api/run-bulk", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload),
+  });
+  if (!res.ok) {
+    const err = await res.json();
+    setStatus(err.error || "Folder run failed.");
+    return;
+  }
+  const { job_id: jobId } = await res.json();
+  runFolderBtn.disabled = true;
+  try {
+    const job = await pollJob(jobId);
+    const summary = job.result;
+    const lines = summary.results.map((r) =>
+      r.doc_id
+        ? `${r.name}: ${r.seconds.toFixed(1)}s, doc ${r.doc_id}`
+        : `${r.name}: FAILED (${r.error})`
+    );
+    setStatus(
+      `Done. ${summary.succeeded} of ${summary.notebooks} notebooks in ${summary.seconds.toFixed(1)}s.\n` +
+        lines.join("\n")
+    );
+  } catch (err) {
+    setStatus(err.message);
+  } finally {
+    runFolderBtn.disabled = false;
+  }
 });
 
 loginBtn.addEventListener("click", async () => {
@@ -0,0 +1,56 @@
+import pytest
+
+import app as web
+from token_store import SessionTokenStore
+
+
+class _Job:
+    id = "job-1"
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    calls = []
+    monkeypatch.setattr(web.jobs, "submit", lambda *args, **kwargs: calls.append(kwargs) or _Job())
+    return calls
+
+
+def post_bulk(body: str):
+    return web.app.test_client().post(
+        "/api/run-bulk", data=body, content_type="application/json"
+    )
+
+
+@pytest.mark.parametrize(
+    "workers, expected",
+    [("500", web.MAX_BULK_WORKERS), ("0", 1), ("-3", 1), ('"2"', 2), ("2.0", 2)],
+)
+def test_bulk_workers_are_clamped(submitted, workers, expected):
+    resp = post_bulk(f'{{"folder_id": "f", "workers": {workers}}}')
+    assert resp.status_code == 202
+    assert submitted[-1]["workers"] == expected
+
+
+@pytest.mark.parametrize(
+    "workers", ['"abc"', "1.5", "true", "null", "[1]", "1e400", "-1e400", "Infinity", "NaN"]
+)
+def test_bad_bulk_workers_are_rejected(submitted, workers):
+    resp = post_bulk(f'{{"folder_id": "f", "workers": {workers}}}')
+    assert resp.status_code == 400
+    assert "workers" in resp.get_json()["error"]
+    assert not submitted
+
+
+def test_logout_removes_a_token_that_no_longer_loads(tmp_path, monkeypatch):
+    store = SessionTokenStore(web.SCOPES, path=str(tmp_path / "tokens.sqlite3"))
+    monkeypatch.setattr(web, "token_store", store)
+    monkeypatch.setenv("WEB_OAUTH", "1")
+    client = web.app.test_client()
+    with client.session_transaction() as session:
+        session["sid"] = "sid-1"
+    store._manager("sid-1")
+    store._db.write("sid-1", "not a token")
+
+    resp = client.post("/api/logout")
+    assert resp.status_code == 200
+    assert store._db.read("sid-1") is None
@@ -0,0 +1,16 @@
+import json
+
+from benchmarks.bench_pipeline import NOTEBOOK_ID, run_config, run_pipeline_once
+from benchmarks.fake_google import FakeGoogle
+from benchmarks.synthetic import make_notebook
+
+
+def test_every_repeat_downloads_and_parses(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw = json.dumps(make_notebook(cells=40, image_every=0)).encode("utf-8")
+    fake = FakeGoogle(files={NOTEBOOK_ID: raw})
+    services = fake.services()
+    for _ in range(3):
+        stages = run_pipeline_once(fake, services, run_config(False))["stages"]
+        assert {"download", "parse"} <= stages.keys()
+    assert not (tmp_path / ".notebook_cache").exists()
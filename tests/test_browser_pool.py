@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from browser_pool import DEFAULT_POOL_SIZE
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_pool_is_closed_at_interpreter_exit():
+    # A stand-in Playwright object on each slot's thread; the atexit hook has
+    # to reach those threads to stop it.
+    script = textwrap.dedent(
+        """
+        import browser_pool
+
+        class FakePlaywright:
+            def stop(self):
+                print("stopped", flush=True)
+
+        pool = browser_pool.get_browser_pool()
+        for slot in pool._slots:
+            slot._submit(setattr, slot, "playwright", FakePlaywright()).result()
+        """
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, timeout=60
+    )
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.split() == ["stopped"] * max(1, DEFAULT_POOL_SIZE)
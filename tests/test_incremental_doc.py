@@ -0,0 +1,282 @@
+import base64
+import hashlib
+import random
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import lab_agent
+import retry
+from run_state import question_fingerprint
+
+
+class DocSim:
+    # Applies the batchUpdate requests the pipeline sends to an in-memory
+    # body. Every UTF-16 code unit is one element (index 1 is the first), each
+    # carrying its font and the named style of the paragraph it belongs to.
+    # Requests Docs would reject (out of range, splitting a surrogate pair,
+    # deleting the final newline) fail the test.
+    def __init__(self):
+        self.units = [{"ch": "\n", "font": None, "style": "NORMAL_TEXT"}]
+
+    def _check_index(self, index: int, allow_end: bool = False):
+        limit = len(self.units) + (1 if allow_end else 0)
+        assert 1 <= index <= limit, f"index {index} outside 1..{limit}"
+        if index <= len(self.units):
+            assert self.units[index - 1]["ch"] != "", "index splits a surrogate pair"
+
+    def _insert(self, index: int, chars: list):
+        self._check_index(index)
+        before = self.units[index - 2] if index > 1 else None
+        style = self.units[index - 1]["style"]
+        font = before["font"] if before is not None else None
+        self.units[index - 1 : index - 1] = [
+            {"ch": ch, "font": font, "style": style} for ch in chars
+        ]
+
+    def _paragraph_bounds(self, position: int):
+        start = position
+        while start > 0 and self.units[start - 1]["ch"] != "\n":
+            start -= 1
+        end = position
+        while self.units[end]["ch"] != "\n":
+            end += 1
+        return start, end + 1
+
+    def apply(self, request: dict):
+        (kind, body), = request.items()
+        if kind == "insertText":
+            chars = []
+            for ch in body["text"]:
+                # Astral characters take two UTF-16 units.
+                chars.extend([ch, ""] if ord(ch) > 0xFFFF else [ch])
+            self._insert(body["location"]["index"], chars)
+        elif kind == "insertInlineImage":
+            self._insert(body["location"]["index"], [("image", body["uri"])])
+        elif kind == "deleteContentRange":
+            start, end = body["range"]["startIndex"], body["range"]["endIndex"]
+            assert start < end
+            self._check_index(start)
+            assert end <= len(self.units), "cannot delete the final newline"
+            assert self.units[end - 1]["ch"] != "", "range splits a surrogate pair"
+            del self.units[start - 1 : end - 1]
+        elif kind == "updateTextStyle":
+            start, end = body["range"]["startIndex"], body["range"]["endIndex"]
+            self._check_index(start)
+            self._check_index(end, allow_end=True)
+            assert body["fields"] == "weightedFontFamily"
+            font = body["textStyle"].get("weightedFontFamily", {}).get("fontFamily")
+            for unit in self.units[start - 1 : end - 1]:
+                unit["font"] = font
+        elif kind == "updateParagraphStyle":
+            start, end = body["range"]["startIndex"], body["range"]["endIndex"]
+            self._check_index(start)
+            self._check_index(end, allow_end=True)
+            style = body["paragraphStyle"]["namedStyleType"]
+            position = start - 1
+            while position < end - 1:
+                first, last = self._paragraph_bounds(position)
+                for unit in self.units[first:last]:
+                    unit["style"] = style
+                position = last
+        else:
+            raise AssertionError(f"unexpected request {kind}")
+
+    def snapshot(self) -> list:
+        # Paragraph styles are read off each paragraph's newline.
+        return [
+            (unit["ch"], unit["font"], unit["style"] if unit["ch"] == "\n" else None)
+            for unit in self.units
+        ]
+
+
+class _Call:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+
+class FakeDocs:
+    # Just enough of the Docs service for create, revision checks and
+    # batchUpdate with requiredRevisionId write control.
+    def __init__(self):
+        self.docs = {}
+
+    def documents(self):
+        return self
+
+    def create(self, body):
+        def run():
+            doc_id = f"doc-{len(self.docs) + 1}"
+            self.docs[doc_id] = [DocSim(), 1]
+            return {"documentId": doc_id, "revisionId": "rev-1"}
+
+        return _Call(run)
+
+    def get(self, documentId, fields=None):
+        return _Call(lambda: {"revisionId": f"rev-{self.docs[documentId][1]}"})
+
+    def batchUpdate(self, documentId, body):
+        def run():
+            entry = self.docs[documentId]
+            required = body.get("writeControl", {}).get("requiredRevisionId")
+            if required is not None and required != f"rev-{entry[1]}":
+                raise HttpError(httplib2.Response({"status": "400"}), b"stale revision")
+            for request in body["requests"]:
+                entry[0].apply(request)
+            entry[1] += 1
+            return {"writeControl": {"requiredRevisionId": f"rev-{entry[1]}"}}
+
+        return _Call(run)
+
+
+WORDS = ["x", "total", "np.mean(a)", "é", "日本", "🙂", "𝔘", "print(i)", "#", "  "]
+
+
+def random_item(rng: random.Random) -> dict:
+    code = "\n".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        for _ in range(rng.randint(1, 4))
+    )
+    item = {"code": code, "outputs": "", "reasoning": ""}
+    if rng.random() < 0.4:
+        item["image_b64"] = base64.b64encode(rng.randbytes(8)).decode("ascii")
+    if rng.random() < 0.3:
+        item["screenshot_png"] = rng.randbytes(8)
+    return item
+
+
+def random_question(rng: random.Random) -> dict:
+    return {"items": [random_item(rng) for _ in range(rng.randint(1, 3))]}
+
+
+def mutate(rng: random.Random, questions: dict) -> dict:
+    questions = {qn: {"items": list(q["items"])} for qn, q in questions.items()}
+    for _ in range(rng.randint(1, 3)):
+        action = rng.random()
+        if action < 0.25 and len(questions) > 1:
+            del questions[rng.choice(list(questions))]
+        elif action < 0.5:
+            qn = str(rng.randint(1, 12))
+            questions[qn] = random_question(rng)
+        elif questions:
+            q = questions[rng.choice(list(questions))]
+            i = rng.randrange(len(q["items"]))
+            q["items"][i] = random_item(rng)
+    return questions
+
+
+def fake_upload(drive_service, raw, prefix="lab-evidence", mimetype="image/png"):
+    return "file-" + hashlib.sha256(raw).hexdigest()[:12]
+
+
+@pytest.fixture
+def docs(monkeypatch):
+    monkeypatch.setattr(lab_agent, "upload_image_bytes", fake_upload)
+    # Small chunks so most updates span several revision-pinned batches.
+    real_chunks = lab_agent.chunk_requests
+    monkeypatch.setattr(
+        lab_agent, "chunk_requests", lambda requests: real_chunks(requests, max_requests=7)
+    )
+    return FakeDocs()
+
+
+def fresh_build(docs: FakeDocs, questions: dict):
+    doc_id, revision_id = lab_agent.create_doc(docs, "Lab Evidence")
+    layout = []
+    requests = lab_agent.build_doc_requests(questions, None, False, layout=layout)
+    revision_id = lab_agent.batch_update_doc(docs, doc_id, requests, revision_id)
+    fingerprints = {qn: question_fingerprint(qn, q) for qn, q in questions.items()}
+    state = {
+        "doc_id": doc_id,
+        "revision_id": revision_id,
+        "header_end": layout[0][1] if layout else 1,
+        "end": layout[-1][2] if layout else 1,
+        "questions": lab_agent._layout_state(layout, fingerprints),
+    }
+    return state
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_incremental_update_matches_fresh_build(docs, seed):
+    rng = random.Random(seed)
+    questions = {str(qn): random_question(rng) for qn in rng.sample(range(1, 10), 3)}
+    state = fresh_build(docs, questions)
+    for _ in range(5):
+        questions = mutate(rng, questions)
+        fingerprints = {qn: question_fingerprint(qn, q) for qn, q in questions.items()}
+        state = lab_agent.update_doc_incrementally(
+            docs, None, state, questions, fingerprints, False
+        )
+        assert state is not None
+        expected = fresh_build(docs, questions)
+        assert docs.docs[state["doc_id"]][0].snapshot() == (
+            docs.docs[expected["doc_id"]][0].snapshot()
+        )
+        assert state["end"] == expected["end"]
+        assert [
+            (q["qn"], q["start"], q["end"]) for q in state["questions"]
+        ] == [(q["qn"], q["start"], q["end"]) for q in expected["questions"]]
+
+
+def test_unchanged_questions_send_no_requests(docs):
+    rng = random.Random(0)
+    questions = {str(qn): random_question(rng) for qn in (1, 2, 3)}
+    state = fresh_build(docs, questions)
+    revision = state["revision_id"]
+    fingerprints = {qn: question_fingerprint(qn, q) for qn, q in questions.items()}
+    state = lab_agent.update_doc_incrementally(
+        docs, None, state, questions, fingerprints, False
+    )
+    assert state["changed"] == []
+    assert state["revision_id"] == revision
+
+
+def test_edited_doc_is_rebuilt(docs):
+    rng = random.Random(1)
+    questions = {"1": random_question(rng)}
+    state = fresh_build(docs, questions)
+    docs.documents().batchUpdate(
+        documentId=state["doc_id"],
+        body={"requests": [{"insertText": {"location": {"index": 1}, "text": "hi"}}]},
+    ).execute()
+    fingerprints = {qn: question_fingerprint(qn, q) for qn, q in questions.items()}
+    assert (
+        lab_agent.update_doc_incrementally(docs, None, state, questions, fingerprints, False)
+        is None
+    )
+
+
+class LostResponseDocs(FakeDocs):
+    # Applies the first batchUpdate, then fails it as if the response timed
+    # out, so execute_with_retry sends the same chunk again.
+    def __init__(self):
+        super().__init__()
+        self.dropped = False
+
+    def batchUpdate(self, documentId, body):
+        call = super().batchUpdate(documentId, body)
+
+        def run():
+            result = call.execute()
+            if not self.dropped:
+                self.dropped = True
+                raise HttpError(httplib2.Response({"status": "503"}), b"backend error")
+            return result
+
+        return _Call(run)
+
+
+def test_retried_first_chunk_is_not_applied_twice(monkeypatch):
+    monkeypatch.setattr(lab_agent, "upload_image_bytes", fake_upload)
+    monkeypatch.setattr(retry, "BASE_DELAY", 0)
+    docs = LostResponseDocs()
+    doc_id, revision_id = lab_agent.create_doc(docs, "Lab Evidence")
+    requests = lab_agent.build_doc_requests({"1": random_question(random.Random(2))}, None, False)
+    with pytest.raises(HttpError):
+        lab_agent.batch_update_doc(docs, doc_id, requests, revision_id)
+    text = "".join(unit["ch"] for unit in docs.docs[doc_id][0].units if isinstance(unit["ch"], str))
+    assert text.count("Lab Evidence") == 1
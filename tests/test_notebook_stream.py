@@ -0,0 +1,74 @@
+import json
+import random
+
+import pytest
+
+from benchmarks.synthetic import make_notebook
+from notebook_stream import NotebookStreamParser
+
+
+def notebook_bytes(cells: int, seed: int = 0) -> bytes:
+    nb = make_notebook(cells=cells, image_every=5, image_bytes=2_000, seed=seed)
+    # Multi-byte characters so chunk boundaries also split UTF-8 sequences.
+    nb["cells"][1]["source"].append("Résumé – 日本語 ✓ 🙂\n")
+    # nbformat writes with indent=1 and the version numbers last.
+    return json.dumps(nb, indent=1, ensure_ascii=False).encode("utf-8")
+
+
+def feed(raw: bytes, sizes) -> dict:
+    parser = NotebookStreamParser()
+    pos = 0
+    for size in sizes:
+        parser.write(raw[pos : pos + size])
+        pos += size
+    parser.write(raw[pos:])
+    return parser.close()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_chunks_match_json_loads(seed):
+    rng = random.Random(seed)
+    raw = notebook_bytes(cells=rng.randint(1, 200), seed=seed)
+    sizes = []
+    total = 0
+    while total < len(raw):
+        size = rng.choice([1, 2, 3, 7, 64, 1000, rng.randint(1, len(raw))])
+        sizes.append(size)
+        total += size
+    assert feed(raw, sizes) == json.loads(raw)
+
+
+def test_single_chunk_and_byte_at_a_time():
+    raw = notebook_bytes(cells=30)
+    expected = json.loads(raw)
+    assert feed(raw, []) == expected
+    assert feed(raw, [1] * len(raw)) == expected
+
+
+def test_truncated_notebook_raises():
+    raw = notebook_bytes(cells=10)
+    parser = NotebookStreamParser()
+    parser.write(raw[:-5])
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_size_limit():
+    raw = notebook_bytes(cells=10)
+    parser = NotebookStreamParser(max_bytes=len(raw) - 1)
+    with pytest.raises(RuntimeError):
+        parser.write(raw)
+
+
+def test_every_two_way_split():
+    raw = notebook_bytes(cells=3)
+    expected = json.loads(raw)
+    for split in range(len(raw) + 1):
+        assert feed(raw, [split]) == expected
+
+
+def test_size_limit_is_inclusive():
+    raw = notebook_bytes(cells=10)
+    parser = NotebookStreamParser(max_bytes=len(raw))
+    parser.write(raw)
+    assert parser.close() == json.loads(raw)
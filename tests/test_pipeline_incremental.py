@@ -0,0 +1,75 @@
+import contextlib
+import io
+import json
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+import lab_agent
+from benchmarks.fake_google import FakeGoogle
+from benchmarks.synthetic import make_notebook
+from run_state import RunStateStore
+
+
+NOTEBOOK_ID = "nb"
+CONFIG = {
+    "notebook_file_id": NOTEBOOK_ID,
+    "class_id": "course-1",
+    "assignment_id": "cw-1",
+    "incremental": True,
+    "screenshot_outputs": False,
+    "notebook_cache": False,
+    "upload_cache": False,
+}
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    fake = FakeGoogle(files={NOTEBOOK_ID: notebook(seed=0)})
+    services = fake.services()
+    creds = Credentials(token="t", refresh_token="r")
+    monkeypatch.setattr(lab_agent, "run_states", RunStateStore(str(tmp_path / "state.json")))
+    monkeypatch.setattr(lab_agent, "get_credentials", lambda session_id=None: creds)
+    monkeypatch.setattr(lab_agent, "get_services", lambda c: services)
+    return fake
+
+
+def notebook(seed: int) -> bytes:
+    return json.dumps(make_notebook(cells=30, image_every=0, seed=seed)).encode("utf-8")
+
+
+def run(turn_in: bool = False) -> str:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return lab_agent.run_pipeline(dict(CONFIG), auto_number=True, turn_in=turn_in)
+
+
+def test_changed_notebook_updates_doc_in_place(fake):
+    doc_id = run()
+    fake.files[NOTEBOOK_ID] = notebook(seed=1)
+    assert run() == doc_id
+
+
+@pytest.mark.parametrize("status", [403, 404])
+def test_rejected_in_place_edit_rebuilds(fake, status):
+    # 403: the Doc turned read-only after turn-in. 404: deleted or trashed.
+    doc_id = run()
+    fake.files[NOTEBOOK_ID] = notebook(seed=1)
+    fake.doc_errors[doc_id] = status
+    new_doc_id = run()
+    assert new_doc_id != doc_id
+    assert fake.docs[new_doc_id] > 1
+    # The rebuilt Doc is remembered for the next run.
+    fake.files[NOTEBOOK_ID] = notebook(seed=2)
+    assert run() == new_doc_id
+
+
+def test_run_state_survives_relogin_and_is_per_account(fake, monkeypatch):
+    doc_id = run()
+    # A new login issues a new refresh token for the same account.
+    relogin = Credentials(token="t2", refresh_token="r2")
+    monkeypatch.setattr(lab_agent, "get_credentials", lambda session_id=None: relogin)
+    assert run() == doc_id
+    other = Credentials(token="t3", refresh_token="r3")
+    monkeypatch.setattr(lab_agent, "get_credentials", lambda session_id=None: other)
+    fake.permission_id = "perm-2"
+    assert run() != doc_id
@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from credentials_store import REFRESH_CHECK_INTERVAL, CredentialManager
+
+
+DEFAULT_DB_PATH = os.getenv("TOKEN_DB_PATH", "tokens.sqlite3")
+# Per-session managers kept in memory; evicted ones reload from SQLite.
+DEFAULT_MAX_CACHED = int(os.getenv("TOKEN_CACHE_SIZE", "1000"))
+
+
+class TokenDatabase:
+    # sqlite3 connections are bound to the thread that opened them, so every
+    # thread gets its own. WAL lets readers proceed while a token is written.
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            "session_id TEXT PRIMARY KEY, token_json TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def read(self, session_id: str):
+        row = self._connect().execute(
+            "SELECT token_json FROM tokens WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def write(self, session_id: str, data: str):
+        self._connect().execute(
+            "INSERT INTO tokens (session_id, token_json, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET "
+            "token_json = excluded.token_json, updated = excluded.updated",
+            (session_id, data, time.time()),
+        )
+
+    def delete(self, session_id: str):
+        self._connect().execute("DELETE FROM tokens WHERE session_id = ?", (session_id,))
+
+
+class _SessionStorage:
+    def __init__(self, db: TokenDatabase, session_id: str):
+        self.db = db
+        self.session_id = session_id
+
+    def read(self):
+        return self.db.read(self.session_id)
+
+    def write(self, data: str):
+        self.db.write(self.session_id, data)
+
+    def delete(self):
+        self.db.delete(self.session_id)
+
+
+class SessionTokenStore:
+    # One CredentialManager per browser session, so every user runs on their
+    # own token and quota. A single background thread keeps the cached
+    # sessions' tokens fresh instead of one thread per session.
+    def __init__(
+        self,
+        scopes: list,
+        path: str = DEFAULT_DB_PATH,
+        max_cached: int = DEFAULT_MAX_CACHED,
+    ):
+        self.scopes = scopes
+        self.path = path
+        self.max_cached = max_cached
+        self._db = None
+        self._managers = OrderedDict()
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._refresher_pid = None
+        self._stop = threading.Event()
+
+    def _manager(self, session_id: str) -> CredentialManager:
+        with self._lock:
+            if self._db is None:
+                self._db = TokenDatabase(self.path)
+            manager = self._managers.get(session_id)
+            if manager is None:
+                manager = CredentialManager(
+                    _SessionStorage(self._db, session_id),
+                    self.scopes,
+                    background_refresh=False,
+                )
+                self._managers[session_id] = manager
+                while len(self._managers) > self.max_cached:
+                    self._managers.popitem(last=False)
+            else:
+                self._managers.move_to_end(session_id)
+        self._ensure_refresher()
+        return manager
+
+    def get(self, session_id: str):
+        if not session_id:
+            return None
+        return self._manager(session_id).get()
+
+    def set(self, session_id: str, creds):
+        self._manager(session_id).set(creds)
+
+    def clear(self, session_id: str):
+        if session_id:
+            self._manager(session_id).clear()
+
+    def is_logged_in(self, session_id: str) -> bool:
+        if not session_id:
+            return False
+        return self._manager(session_id).is_logged_in()
+
+    def _ensure_refresher(self):
+        if self._refresher is not None and self._refresher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._refresher is not None and self._refresher_pid == os.getpid():
+                return
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, name="session-token-refresh", daemon=True
+            )
+            self._refresher_pid = os.getpid()
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(REFRESH_CHECK_INTERVAL):
+            with self._lock:
+                managers = list(self._managers.values())
+            for manager in managers:
+                manager.refresh_if_due()
+
+    def stop(self):
+        self._stop.set()
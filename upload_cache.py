@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from googleapiclient.errors import HttpError
+
+from retry import execute_with_retry
+from storage import read_json, write_atomic
+
+
+DEFAULT_CACHE_PATH = os.getenv("UPLOAD_CACHE_PATH", ".upload_cache.json")
+DEFAULT_MAX_ENTRIES = int(os.getenv("UPLOAD_CACHE_MAX_ENTRIES", "5000"))
+# How long a Drive lookup vouches for an entry before it is checked again.
+VALIDATE_TTL = 6 * 60 * 60
+
+
+def image_digest(raw: bytes, settings: dict = None) -> str:
+    # Keyed on the bytes as they came out of the notebook, plus the settings
+    # they are re-encoded with, so a hit skips the re-encode as well.
+    digest = hashlib.sha256(raw).hexdigest()
+    if settings:
+        digest += ":" + ",".join(f"{k}={v}" for k, v in sorted(settings.items()))
+    return digest
+
+
+class UploadCache:
+    def __init__(
+        self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        data = read_json(self.path, {})
+        entries = sorted(
+            data.get("entries", {}).items(), key=lambda kv: kv[1].get("last_used", 0)
+        )
+        self._entries = OrderedDict(entries)
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._dirty = True
+
+    def get(self, digest: str):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            entry["last_used"] = time.time()
+            self._entries.move_to_end(digest)
+            self._dirty = True
+            return dict(entry)
+
+    def put(self, digest: str, file_id: str, size: int, shared: bool = False):
+        now = time.time()
+        with self._lock:
+            self._entries[digest] = {
+                "file_id": file_id,
+                "size": size,
+                "shared": shared,
+                "last_used": now,
+                "validated": now,
+            }
+            self._entries.move_to_end(digest)
+            self._dirty = True
+            self._evict()
+
+    def update(self, digest: str, **fields):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                entry.update(fields)
+                self._dirty = True
+
+    def discard(self, digest: str):
+        with self._lock:
+            if self._entries.pop(digest, None) is not None:
+                self._dirty = True
+
+    def mark_shared(self, file_ids):
+        file_ids = set(file_ids)
+        with self._lock:
+            for entry in self._entries.values():
+                if entry["file_id"] in file_ids and not entry.get("shared"):
+                    entry["shared"] = True
+                    self._dirty = True
+
+    def lookup(self, digest: str, drive_service):
+        entry = self.get(digest)
+        if entry is None:
+            return None
+        if time.time() - entry.get("validated", 0) < VALIDATE_TTL:
+            return entry
+        if not file_is_live(drive_service, entry["file_id"]):
+            self.discard(digest)
+            return None
+        self.update(digest, validated=time.time())
+        return entry
+
+    def scoped(self, namespace: str) -> "ScopedUploadCache":
+        return ScopedUploadCache(self, namespace)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty or not self.path:
+                return
+            payload = json.dumps({"entries": self._entries})
+            self._dirty = False
+        try:
+            write_atomic(self.path, payload)
+        except OSError:
+            pass
+
+
+class ScopedUploadCache:
+    # Per-user view of a shared cache: digests are namespaced so one user's
+    # Drive file is never embedded in another user's Doc.
+    def __init__(self, cache: UploadCache, namespace: str):
+        self.cache = cache
+        self.namespace = namespace
+
+    def _key(self, digest: str) -> str:
+        return f"{self.namespace}:{digest}"
+
+    def lookup(self, digest: str, drive_service):
+        return self.cache.lookup(self._key(digest), drive_service)
+
+    def put(self, digest: str, file_id: str, size: int, shared: bool = False):
+        self.cache.put(self._key(digest), file_id, size, shared)
+
+    def mark_shared(self, file_ids):
+        self.cache.mark_shared(file_ids)
+
+    def save(self):
+        self.cache.save()
+
+
+def file_is_live(drive_service, file_id: str) -> bool:
+    try:
+        meta = execute_with_retry(
+            drive_service.files().get(
+                fileId=file_id, fields="id,trashed", supportsAllDrives=True
+            )
+        )
+    except HttpError as exc:
+        if exc.resp.status in (403, 404):
+            return False
+        raise
+    return not meta.get("trashed", False)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_upload_cache() -> UploadCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = UploadCache()
+    return _cache